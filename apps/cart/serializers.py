@@ -15,10 +15,9 @@ class CartItemSerializer(serializers.ModelSerializer):
     def get_product_image(self, obj):
         if obj.product.image:
             return self.context['request'].build_absolute_uri(obj.product.image.url)
-        # Try to get the first product image if main image is not available
-        first_image = obj.product.images.filter(is_primary=True).first()
-        if first_image:
-            return self.context['request'].build_absolute_uri(first_image.image.url)
+        # Try the primary product image (denormalized on the product) if main image is not available
+        if obj.product.primary_image_url:
+            return self.context['request'].build_absolute_uri(obj.product.primary_image_url)
         # Return the first available image
         first_image = obj.product.images.first()
         if first_image:
@@ -2,6 +2,7 @@
 from rest_framework import serializers
 from .models import Category
 from apps.products.models import Product
+from utils.fieldsets import SparseFieldsetSerializerMixin
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -38,7 +39,7 @@ class CategorySerializer(serializers.ModelSerializer):
         return []
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Product model
     """
@@ -81,6 +82,22 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['slug', 'created_at', 'updated_at', 'discount_percentage', 'stock_status']
     
+    # What a listing card shows: name, price, image and rating
+    projections = {
+        'card': (
+            'id', 'name', 'slug', 'price', 'original_price', 'discount_percentage', 'is_on_sale',
+            'stock_status', 'is_in_stock', 'primary_image', 'rating_average', 'rating_count',
+        ),
+    }
+    field_columns = {
+        'discount_amount': ('price', 'original_price'),
+        'is_on_sale': ('price', 'original_price'),
+        'category_name': ('category__name',),
+        'brand_name': ('brand__name',),
+        'is_in_stock': ('stock',),
+        'primary_image': ('primary_image_path',),
+    }
+    
     def get_is_in_stock(self, obj):
         return obj.stock > 0
     
@@ -91,12 +108,12 @@ class ProductSerializer(serializers.ModelSerializer):
         return obj.is_on_sale()
     
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
-        if primary_image:
+        url = obj.primary_image_url
+        if url:
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(primary_image.image.url)
-            return primary_image.image.url
+                return request.build_absolute_uri(url)
+            return url
         return None
 
 
@@ -4,16 +4,20 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.db.models import Count, Q
 from .models import Category
+from apps.products.catalog import DEFAULT_SORT, CatalogListMixin
+from utils.cache import CachedResponseMixin, ConditionalGetMixin
+from utils.fieldsets import SparseFieldsetMixin
 from apps.products.models import Product
 from .serializers import CategorySerializer, ProductSerializer
 
 
-class CategoryListView(generics.ListCreateAPIView):
+class CategoryListView(CachedResponseMixin, generics.ListCreateAPIView):
     """
     List all categories or create a new category
     GET: Returns all categories
     POST: Creates a new category (admin only)
     """
+    cache_entities = ('category', 'product')
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     
@@ -50,13 +54,14 @@ class CategoryListView(generics.ListCreateAPIView):
         return queryset.order_by('name')
 
 
-class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CategoryDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a category
     GET: Returns category details
     PUT/PATCH: Updates category (admin only)
     DELETE: Deletes category (admin only)
     """
+    cache_entities = ('category', 'product')
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     
@@ -83,11 +88,12 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response(data)
 
 
-class CategoryProductsView(generics.ListAPIView):
+class CategoryProductsView(CachedResponseMixin, SparseFieldsetMixin, CatalogListMixin, generics.ListAPIView):
     """
     List all products in a specific category
     GET: Returns all products for a category
     """
+    cache_entities = ('product', 'category', 'brand')
     serializer_class = ProductSerializer
     
     def get_queryset(self):
@@ -129,45 +135,67 @@ class CategoryProductsView(generics.ListAPIView):
             
         return queryset.order_by('-created_at')
     
+    def catalog_filters(self):
+        """
+        CatalogIndex filters for the same query params; text search and
+        unparseable prices are left to get_queryset
+        """
+        params = self.request.query_params
+        if params.get('search'):
+            return None
+        filters = {'category': int(self.kwargs['pk'])}
+        try:
+            if params.get('min_price'):
+                filters['min_price'] = float(params['min_price'])
+            if params.get('max_price'):
+                filters['max_price'] = float(params['max_price'])
+        except ValueError:
+            return None
+        if params.get('brand'):
+            filters['brand_slug'] = params['brand']
+        if params.get('featured'):
+            filters['is_featured'] = True
+        if params.get('in_stock'):
+            filters['in_stock'] = True
+        return filters
+    
+    def catalog_sort(self):
+        return DEFAULT_SORT
+    
+    def catalog_queryset(self):
+        return self.restrict_columns(super().catalog_queryset())
+    
     def list(self, request, *args, **kwargs):
         """
         Custom list response with category info
         """
         category_id = self.kwargs['pk']
         category = get_object_or_404(Category, pk=category_id)
+        category_data = {
+            'id': category.id,
+            'name': category.name,
+            'description': category.description,
+            'slug': category.slug
+        }
         
-        queryset = self.get_queryset()
-        page = self.paginate_queryset(queryset)
-        
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            response = self.get_paginated_response(serializer.data)
-            response.data['category'] = {
-                'id': category.id,
-                'name': category.name,
-                'description': category.description,
-                'slug': category.slug
-            }
+        response = super().list(request, *args, **kwargs)
+        if isinstance(response.data, dict):
+            response.data['category'] = category_data
             return response
         
-        serializer = self.get_serializer(queryset, many=True)
         return Response({
-            'category': {
-                'id': category.id,
-                'name': category.name,
-                'description': category.description,
-                'slug': category.slug
-            },
-            'products': serializer.data
+            'category': category_data,
+            'products': response.data
         })
 
 
 # Additional utility views you might need
 
-class PopularCategoriesView(generics.ListAPIView):
+class PopularCategoriesView(CachedResponseMixin, generics.ListAPIView):
     """
     Get categories with most products
     """
+    cache_entities = ('category', 'product')
     serializer_class = CategorySerializer
     
     def get_queryset(self):
@@ -0,0 +1,215 @@
+# Approximate nearest-neighbour search: inverted file + product quantization
+import numpy as np
+
+
+def nearest_centroid(data, centroids, chunk_size=8192):
+    """Index of the closest centroid (L2) for every row of ``data``"""
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignment = np.empty(data.shape[0], dtype=np.int64)
+    for start in range(0, data.shape[0], chunk_size):
+        block = data[start:start + chunk_size]
+        # ||x - c||^2 without the constant ||x||^2 term
+        distances = centroid_norms - 2.0 * (block @ centroids.T)
+        assignment[start:start + chunk_size] = distances.argmin(axis=1)
+    return assignment
+
+
+def kmeans(data, k, iterations=20, seed=0):
+    """Plain Lloyd's k-means; returns float32 centroids of shape (k, d)"""
+    rng = np.random.default_rng(seed)
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    k = min(k, data.shape[0])
+    centroids = data[rng.choice(data.shape[0], k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = nearest_centroid(data, centroids)
+        counts = np.bincount(assignment, minlength=k)
+
+        # Sum members per cluster with one sorted reduceat instead of np.add.at
+        order = np.argsort(assignment, kind='stable')
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[filled] = sums / counts[filled, None]
+
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(data.shape[0], len(empty), replace=False)]
+
+    return centroids
+
+
+class IVFPQIndex:
+    """
+    IVF-PQ index over L2-normalised vectors.
+
+    Vectors are bucketed by their nearest coarse centroid; the residual to
+    that centroid is compressed to ``m`` one-byte product-quantizer codes.
+    A query probes the ``nprobe`` closest buckets and scores their codes
+    with a per-query lookup table (asymmetric distance computation).
+    """
+
+    def __init__(self, dim, nlist=1024, m=16, ksub=256, nprobe=16):
+        if dim % m:
+            raise ValueError(f'Dimension {dim} is not divisible by m={m}')
+        if ksub > 256:
+            raise ValueError('ksub must fit in one byte')
+        self.dim = dim
+        self.nlist = nlist
+        self.m = m
+        self.ksub = ksub
+        self.nprobe = nprobe
+
+        self.centroids = None
+        self.codebooks = None
+        self.codes = np.empty((0, m), dtype=np.uint8)
+        self.positions = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(nlist + 1, dtype=np.int64)
+        self.labels = np.empty(0, dtype=np.int64)
+
+    @property
+    def dsub(self):
+        return self.dim // self.m
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return self.labels.shape[0]
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def _split(self, vectors):
+        # (n, d) -> (m, n, dsub) views of each subspace
+        return vectors.reshape(vectors.shape[0], self.m, self.dsub).transpose(1, 0, 2)
+
+    def train(self, vectors, iterations=20, seed=0):
+        vectors = self._normalize(vectors)
+        self.centroids = kmeans(vectors, self.nlist, iterations, seed)
+        self.nlist = self.centroids.shape[0]
+        self.offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+
+        residuals = vectors - self.centroids[nearest_centroid(vectors, self.centroids)]
+        self.codebooks = np.stack([
+            self._pad_codebook(kmeans(sub, self.ksub, iterations, seed + j))
+            for j, sub in enumerate(self._split(residuals))
+        ])
+        return self
+
+    def _pad_codebook(self, codebook):
+        # Small training sets yield fewer than ksub codewords
+        if codebook.shape[0] < self.ksub:
+            padding = np.repeat(codebook[-1:], self.ksub - codebook.shape[0], axis=0)
+            codebook = np.concatenate([codebook, padding])
+        return codebook
+
+    def encode(self, vectors, lists):
+        residuals = vectors - self.centroids[lists]
+        codes = np.empty((vectors.shape[0], self.m), dtype=np.uint8)
+        for j, sub in enumerate(self._split(residuals)):
+            codes[:, j] = nearest_centroid(np.ascontiguousarray(sub), self.codebooks[j])
+        return codes
+
+    def add(self, vectors, labels):
+        """Add vectors tagged with integer labels (e.g. product ids)"""
+        if not self.is_trained:
+            raise RuntimeError('Index must be trained before vectors are added')
+        vectors = self._normalize(vectors)
+        labels = np.asarray(labels, dtype=np.int64)
+        lists = nearest_centroid(vectors, self.centroids)
+        codes = self.encode(vectors, lists)
+        positions = np.arange(len(self), len(self) + vectors.shape[0], dtype=np.int64)
+
+        # Rebuild the inverted lists as one list-sorted (CSR) layout
+        old_lists = np.repeat(np.arange(self.nlist), np.diff(self.offsets))
+        all_lists = np.concatenate([old_lists, lists])
+        order = np.argsort(all_lists, kind='stable')
+        self.codes = np.concatenate([self.codes, codes])[order]
+        self.positions = np.concatenate([self.positions, positions])[order]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(all_lists, minlength=self.nlist))))
+        self.labels = np.concatenate([self.labels, labels])
+        return self
+
+    def search_vectors(self, query, k=10, nprobe=None, allowed=None):
+        """
+        Approximate top-k by inner product; returns (positions, scores)
+
+        ``allowed`` is an optional boolean mask over insertion positions;
+        excluded vectors are dropped before their codes are scored.
+        """
+        if not len(self) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = self._normalize(query)[0]
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+
+        coarse_scores = self.centroids @ query
+        coarse_distances = np.einsum('ij,ij->i', self.centroids, self.centroids) - 2.0 * coarse_scores
+        probe = np.argpartition(coarse_distances, nprobe - 1)[:nprobe]
+
+        starts = self.offsets[probe]
+        lengths = self.offsets[probe + 1] - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate([np.arange(s, s + n) for s, n in zip(starts, lengths) if n])
+        scores = np.repeat(coarse_scores[probe], lengths)
+        if allowed is not None:
+            keep = allowed[self.positions[rows]]
+            rows, scores = rows[keep], scores[keep]
+            if not rows.shape[0]:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Lookup table of query . codeword for every subspace
+        table = np.matmul(self.codebooks, query.reshape(self.m, self.dsub, 1))[..., 0]
+        table_offsets = np.arange(self.m) * self.ksub
+        scores += table.ravel()[self.codes[rows] + table_offsets].sum(axis=1)
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return self.positions[rows[top]], scores[top]
+
+    def search(self, vector, k=12, nprobe=None, oversample=4, allowed=None):
+        """Return up to ``k`` ``(label, score)`` pairs with distinct labels"""
+        positions, scores = self.search_vectors(vector, k * oversample, nprobe, allowed)
+        results = []
+        seen = set()
+        for label, score in zip(self.labels[positions], scores):
+            if label in seen:
+                continue
+            seen.add(label)
+            results.append((int(label), float(score)))
+            if len(results) == k:
+                break
+        return results
+
+    def save(self, path):
+        np.savez(
+            path,
+            params=np.array([self.dim, self.nlist, self.m, self.ksub, self.nprobe]),
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            codes=self.codes,
+            positions=self.positions,
+            offsets=self.offsets,
+            labels=self.labels,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            dim, nlist, m, ksub, nprobe = (int(value) for value in data['params'])
+            index = cls(dim, nlist=nlist, m=m, ksub=ksub, nprobe=nprobe)
+            index.centroids = data['centroids']
+            index.codebooks = data['codebooks']
+            index.codes = data['codes']
+            index.positions = data['positions']
+            index.offsets = data['offsets']
+            index.labels = data['labels']
+        return index
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class ImageSearchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.image_search'
\ No newline at end of file
+    name = 'apps.image_search'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,56 @@
+# BK-tree over 64-bit perceptual hashes (Hamming metric)
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree: each child edge is labelled with its distance to
+    the parent, so a radius query only descends edges within
+    ``[d - radius, d + radius]`` (triangle inequality).
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value, item):
+        """Insert ``item`` under hash ``value``; equal hashes share a node"""
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """All ``(distance, item)`` pairs within ``radius`` of ``value``, closest first"""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.extend((distance, item) for item in items)
+            for edge in range(max(distance - radius, 0), distance + radius + 1):
+                child = children.get(edge)
+                if child is not None:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
@@ -0,0 +1,17 @@
+# Cache of image-search results keyed by the uploaded bytes
+import hashlib
+
+from django.conf import settings
+
+from utils.query_cache import QueryCache
+
+
+def content_hash(data):
+    """BLAKE2b digest of uploaded image bytes"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+query_cache = QueryCache(
+    max_entries=getattr(settings, 'IMAGE_SEARCH_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'IMAGE_SEARCH_CACHE_TTL', 600),
+)
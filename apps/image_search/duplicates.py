@@ -0,0 +1,155 @@
+# In-memory near-duplicate lookup over stored perceptual hashes
+import hashlib
+import threading
+
+from django.conf import settings
+
+from apps.products.models import Product, ProductImage
+from .bktree import BKTree
+
+PRODUCT_IMAGE = 'image'
+PRODUCT = 'product'
+
+
+class HashIndex:
+    """
+    BK-tree of the phash of every ProductImage and Product.image, keyed by
+    ``(kind, pk)``. Hashes can be added in place; a changed hash marks the
+    index stale because BK-trees do not support removal.
+    """
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.hashes = {}
+        self.stale = False
+
+    @classmethod
+    def from_database(cls):
+        index = cls()
+        for pk, phash in ProductImage.objects.exclude(phash='').values_list('pk', 'phash').iterator(chunk_size=5000):
+            index.update((PRODUCT_IMAGE, pk), phash)
+        for pk, phash in Product.objects.exclude(phash='').values_list('pk', 'phash').iterator(chunk_size=5000):
+            index.update((PRODUCT, pk), phash)
+        return index
+
+    def update(self, key, phash):
+        if not phash:
+            return
+        value = int(phash, 16)
+        previous = self.hashes.get(key)
+        if previous == value:
+            return
+        if previous is not None:
+            self.stale = True
+        self.hashes[key] = value
+        self.tree.add(value, (key, value))
+
+    def search(self, phash, radius, kind=None):
+        """``(distance, pk)`` pairs within ``radius``, optionally of one kind"""
+        return [
+            (distance, key[1])
+            for distance, (key, value) in self.tree.search(int(phash, 16), radius)
+            # Skip entries whose hash has changed since they were added
+            if self.hashes.get(key) == value and (kind is None or key[0] == kind)
+        ]
+
+
+_hash_index = None
+_hash_index_lock = threading.Lock()
+
+
+def get_hash_index():
+    global _hash_index
+    index = _hash_index
+    if index is None or index.stale:
+        with _hash_index_lock:
+            if _hash_index is None or _hash_index.stale:
+                _hash_index = HashIndex.from_database()
+            index = _hash_index
+    return index
+
+
+def update_hash_index(kind, pk, phash):
+    """Record a new hash if the index is loaded in this process"""
+    index = _hash_index
+    if index is not None:
+        with _hash_index_lock:
+            index.update((kind, pk), phash)
+
+
+def reset_hash_index():
+    global _hash_index
+    with _hash_index_lock:
+        _hash_index = None
+
+
+def find_duplicate_image(phash, radius=None):
+    """Closest stored ProductImage within ``radius`` of ``phash``, or None"""
+    if radius is None:
+        radius = settings.IMAGE_SEARCH_DUPLICATE_RADIUS
+    for _, pk in get_hash_index().search(phash, radius, kind=PRODUCT_IMAGE):
+        image = ProductImage.objects.filter(pk=pk).first()
+        if image is not None:
+            return image
+    return None
+
+
+def find_duplicate_product_image(phash, radius=None):
+    """Closest stored Product.image within ``radius`` of ``phash``, or None"""
+    if radius is None:
+        radius = settings.IMAGE_SEARCH_DUPLICATE_RADIUS
+    for _, pk in get_hash_index().search(phash, radius, kind=PRODUCT):
+        product = Product.objects.filter(pk=pk).exclude(image='').only('pk', 'image', 'phash').first()
+        if product is not None:
+            return product
+    return None
+
+
+def content_digest(source):
+    """SHA-256 of a path's or a Django File's bytes"""
+    digest = hashlib.sha256()
+    if isinstance(source, str):
+        with open(source, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(1 << 16), b''):
+                digest.update(chunk)
+    else:
+        for chunk in source.chunks():
+            digest.update(chunk)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+def _identical(candidates, stored_file, content):
+    """First candidate whose stored file has exactly the bytes of ``content``"""
+    digest = None
+    for candidate in candidates:
+        stored = stored_file(candidate)
+        try:
+            with stored.open('rb'):
+                stored_digest = content_digest(stored)
+        except (OSError, ValueError):
+            continue
+        if digest is None:
+            digest = content_digest(content)
+        if stored_digest == digest:
+            return candidate
+    return None
+
+
+def find_identical_image(phash, content):
+    """
+    Stored ProductImage whose file has the same bytes as ``content`` (a
+    path or File), or None. Only an exact copy may share a stored file:
+    near-duplicates by phash include colour variants, which a grayscale
+    hash cannot tell apart.
+    """
+    # Identical bytes have identical hashes
+    pks = [pk for _, pk in get_hash_index().search(phash, 0, kind=PRODUCT_IMAGE)]
+    return _identical(ProductImage.objects.filter(pk__in=pks), lambda image: image.image, content)
+
+
+def find_identical_product_image(phash, content):
+    """Product whose stored image has the same bytes as ``content``, or None"""
+    pks = [pk for _, pk in get_hash_index().search(phash, 0, kind=PRODUCT)]
+    products = Product.objects.filter(pk__in=pks).exclude(image='').only('pk', 'image', 'phash')
+    return _identical(products, lambda product: product.image, content)
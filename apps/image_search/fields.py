@@ -0,0 +1,90 @@
+# Compact binary storage for embedding vectors
+import base64
+import struct
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import models
+
+# magic, format version, dtype code, dimension
+HEADER = struct.Struct('<2sBBI')
+MAGIC = b'FV'
+FORMAT_VERSION = 1
+
+DTYPE_CODES = {
+    'float32': 1,
+    'float16': 2,
+}
+CODE_DTYPES = {code: np.dtype(name) for name, code in DTYPE_CODES.items()}
+
+
+def encode_vector(vector, dtype='float32'):
+    """Pack a 1-d vector into header + little-endian float bytes"""
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f'Unsupported vector dtype: {dtype}')
+    array = np.asarray(vector, dtype=np.dtype(dtype).newbyteorder('<')).ravel()
+    return HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_CODES[dtype], array.shape[0]) + array.tobytes()
+
+
+def decode_vector(data):
+    """
+    Unpack bytes written by encode_vector
+
+    The returned array is a read-only view over ``data`` (no copy).
+    """
+    magic, version, code, dim = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION or code not in CODE_DTYPES:
+        raise ValueError('Not an encoded feature vector')
+    dtype = CODE_DTYPES[code].newbyteorder('<')
+    return np.frombuffer(data, dtype=dtype, count=dim, offset=HEADER.size)
+
+
+class VectorField(models.BinaryField):
+    """
+    Stores a float vector as raw float32 (or float16) bytes with a small
+    dimension/version header. Values read from the database come back as
+    NumPy arrays decoded with ``np.frombuffer``.
+    """
+    description = 'Binary-encoded float vector'
+
+    def __init__(self, *args, dtype='float32', **kwargs):
+        if dtype not in DTYPE_CODES:
+            raise ValueError(f'Unsupported vector dtype: {dtype}')
+        self.dtype = dtype
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dtype != 'float32':
+            kwargs['dtype'] = self.dtype
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return decode_vector(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, (list, tuple)):
+            return np.asarray(value, dtype=np.float32)
+        if isinstance(value, str):
+            value = base64.b64decode(value.encode('ascii'))
+        try:
+            return decode_vector(value)
+        except (ValueError, struct.error):
+            raise ValidationError('Invalid feature vector', code='invalid')
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is not None and not isinstance(value, (bytes, bytearray, memoryview)):
+            value = encode_vector(value, self.dtype)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        if value is None:
+            return None
+        if not isinstance(value, (bytes, bytearray, memoryview)):
+            value = encode_vector(value, self.dtype)
+        return base64.b64encode(bytes(value)).decode('ascii')
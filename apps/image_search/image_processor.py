@@ -1,7 +1,119 @@
 # Image processing utilities
+import io
+
+import numpy as np
+from PIL import Image
+
+# Bins per RGB channel for the colour histogram (8 x 8 x 8 joint bins)
+HISTOGRAM_BINS = 8
+HISTOGRAM_DIM = HISTOGRAM_BINS ** 3
+
+# 64-bit DCT perceptual hash (8 x 8 low frequencies of a 32 x 32 image)
+HASH_SIZE = 8
+HASH_IMAGE_SIZE = 32
+HASH_DIM = HASH_SIZE * HASH_SIZE
+
+# Share of the cosine similarity contributed by the perceptual hash
+HASH_WEIGHT = 0.25
+
+FEATURE_DIM = HISTOGRAM_DIM + HASH_DIM
+
+# Images are shrunk to this size before features are taken
+FEATURE_IMAGE_SIZE = (128, 128)
+
+# Integer reduce() stops this many times above the target size, leaving
+# the last step to a proper resampling filter
+REDUCING_GAP = 2.0
+
+
+def load_image(image_path, size, mode=None):
+    """
+    Open an image decoded at no more than about REDUCING_GAP times ``size``
+
+    JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale via ``draft()``
+    (and straight to greyscale for mode 'L'); other formats are shrunk with
+    a cheap integer ``reduce()`` before the final resample. The returned
+    image is fully loaded, so the source may be closed or rewound.
+    """
+    with Image.open(image_path) as img:
+        gap = (int(size[0] * REDUCING_GAP), int(size[1] * REDUCING_GAP))
+        img.draft(mode or img.mode, gap)
+        img.thumbnail(size, reducing_gap=REDUCING_GAP)
+        img.load()
+    if mode and img.mode != mode:
+        img = img.convert(mode)
+    if hasattr(image_path, 'seek'):
+        image_path.seek(0)
+    return img
+
+
+def _dct_matrix(size):
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT = _dct_matrix(HASH_IMAGE_SIZE)
+
+
+def colour_histogram(img):
+    """
+    Joint RGB histogram of a PIL image, Hellinger-normalised so that the
+    dot product of two histograms is their cosine similarity
+    """
+    pixels = np.asarray(img.convert('RGB'), dtype=np.uint8).reshape(-1, 3)
+    shift = 8 - int(np.log2(HISTOGRAM_BINS))
+    quantized = (pixels >> shift).astype(np.intp)
+    bins = (quantized[:, 0] * HISTOGRAM_BINS + quantized[:, 1]) * HISTOGRAM_BINS + quantized[:, 2]
+    counts = np.bincount(bins, minlength=HISTOGRAM_DIM).astype(np.float32)
+    total = counts.sum()
+    if total:
+        counts /= total
+    return np.sqrt(counts)
+
+
+def hash_bits(img):
+    """64 pHash bits of a PIL image as a boolean array"""
+    gray = img.convert('L').resize((HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.Resampling.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only reflects overall brightness
+    return (low > np.median(low.ravel()[1:])).ravel()
+
+
+def perceptual_hash(img):
+    """64-bit DCT perceptual hash of a PIL image as an unsigned int"""
+    return int.from_bytes(np.packbits(hash_bits(img)).tobytes(), 'big')
+
+
+def image_phash(image_path):
+    """Perceptual hash of an image path or file-like object as 16 hex digits"""
+    return format(perceptual_hash(load_image(image_path, FEATURE_IMAGE_SIZE, 'L')), '016x')
+
+
+def image_features(img):
+    """
+    Feature vector of a PIL image: colour histogram followed by the
+    perceptual hash as +/-1 values, each part weighted so the whole vector
+    has unit length
+    """
+    histogram = colour_histogram(img) * np.float32(np.sqrt(1 - HASH_WEIGHT))
+    bits = hash_bits(img).astype(np.float32) * 2 - 1
+    bits *= np.float32(np.sqrt(HASH_WEIGHT / HASH_DIM))
+    return np.concatenate([histogram, bits])
+
 
 def process_image(image_path):
     """
     Process image for search functionality
+
+    Accepts a path or file-like object and returns a float32 feature vector
+    of length FEATURE_DIM.
     """
-    pass
\ No newline at end of file
+    return image_features(load_image(image_path, FEATURE_IMAGE_SIZE, 'RGB'))
+
+
+def process_image_bytes(data):
+    """process_image for raw uploaded bytes (picklable for worker processes)"""
+    return process_image(io.BytesIO(data))
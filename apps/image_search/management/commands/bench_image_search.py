@@ -0,0 +1,208 @@
+import json
+import os
+import platform
+import resource
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.image_search.ann import IVFPQIndex
+from apps.image_search.image_processor import FEATURE_DIM
+from apps.image_search.vector_index import ApproximateIndex, ProductAttributes, VectorIndex
+
+
+class Command(BaseCommand):
+    help = 'Benchmark exact and IVF-PQ image search: latency percentiles, QPS per core, memory and recall@k.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['synthetic', 'database'], default='synthetic',
+                            help='Generate a catalog or use the stored feature vectors')
+        parser.add_argument('--fixture', help='.npy matrix of embeddings to use instead (one row per image)')
+        parser.add_argument('--n', type=int, default=100000, help='Synthetic image embeddings')
+        parser.add_argument('--images-per-product', type=int, default=3, help='Synthetic images per product')
+        parser.add_argument('--clusters', type=int, default=256, help='Synthetic visual clusters')
+        parser.add_argument('--queries', type=int, default=500, help='Timed queries per configuration')
+        parser.add_argument('--query-noise', type=float, default=0.05,
+                            help='Gaussian noise added to sampled catalog vectors to make queries')
+        parser.add_argument('--k', default='12', help='Comma-separated k values')
+        parser.add_argument('--nprobe', default='4,16,64', help='Comma-separated nprobe values for IVF-PQ')
+        parser.add_argument('--rerank', type=int, default=settings.IMAGE_SEARCH_RERANK,
+                            help='IVF-PQ shortlists rerank * k products for exact re-ranking')
+        parser.add_argument('--nlist', type=int, default=0, help='Coarse centroids (default: 4 * sqrt(N))')
+        parser.add_argument('--m', type=int, default=16, help='PQ sub-quantizers')
+        parser.add_argument('--train-size', type=int, default=100000, help='Vectors sampled for training')
+        parser.add_argument('--iterations', type=int, default=20, help='k-means iterations')
+        parser.add_argument('--skip-ann', action='store_true', help='Only benchmark exact search')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='JSON results file (default: benchmarks/image_search_<timestamp>.json)')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        ks = [int(value) for value in options['k'].split(',') if value]
+        nprobes = [int(value) for value in options['nprobe'].split(',') if value]
+
+        started = time.perf_counter()
+        vectors, product_ids = self.catalog(options, rng)
+        if not len(vectors):
+            raise CommandError('No feature vectors to benchmark.')
+        exact = VectorIndex(vectors, product_ids, dim=vectors.shape[1])
+        # Every product passes the (empty) filters without touching the database
+        exact._attributes = self.all_active(exact.product_ids)
+        del vectors
+        self.stdout.write(
+            f'Catalog: {len(exact)} vectors, {len(exact.product_ids)} products, dim={exact.dim} '
+            f'({time.perf_counter() - started:.1f}s)'
+        )
+
+        queries = self.make_queries(exact.matrix, rng, options['queries'], options['query_noise'])
+        results = {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'host': {
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'cpu_count': os.cpu_count(),
+            },
+            'catalog': {
+                'source': 'fixture' if options['fixture'] else options['source'],
+                'vectors': len(exact),
+                'products': int(len(exact.product_ids)),
+                'dim': exact.dim,
+            },
+            'queries': len(queries),
+            'memory': {'exact_bytes': self.nbytes(exact.matrix, exact.row_product_ids,
+                                                  exact.group_starts, exact.product_ids)},
+            'runs': [],
+        }
+
+        approximate = None
+        if not options['skip_ann']:
+            approximate, build_seconds = self.build_ann(exact, rng, options)
+            ivfpq = approximate.ivfpq
+            results['ann'] = {
+                'nlist': ivfpq.nlist,
+                'm': ivfpq.m,
+                'train_size': min(options['train_size'], len(exact)),
+                'build_seconds': round(build_seconds, 3),
+            }
+            results['memory']['ann_bytes'] = self.nbytes(
+                ivfpq.centroids, ivfpq.codebooks, ivfpq.codes, ivfpq.positions, ivfpq.offsets,
+                ivfpq.labels, approximate.slots, approximate.unindexed,
+            )
+
+        for k in ks:
+            run, truth = self.timed(lambda query: exact.search(query, k=k), queries)
+            run.update(method='exact', k=k, recall=1.0)
+            results['runs'].append(run)
+            self.report(run)
+
+            if approximate is None:
+                continue
+            for nprobe in nprobes:
+                approximate.ivfpq.nprobe = nprobe
+                run, found = self.timed(lambda query: approximate.search(query, k=k), queries)
+                hits = sum(len(set(expected) & set(got)) for expected, got in zip(truth, found))
+                expected_total = sum(len(expected) for expected in truth)
+                run.update(method='ivfpq', k=k, nprobe=nprobe, rerank=approximate.rerank,
+                           recall=round(hits / expected_total, 4) if expected_total else 0.0)
+                results['runs'].append(run)
+                self.report(run)
+
+        # ru_maxrss is in kilobytes on Linux
+        results['memory']['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        for key, value in results['memory'].items():
+            self.stdout.write(f'{key}: {value / 2 ** 20:.1f} MiB')
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', f'image_search_{datetime.now():%Y%m%d_%H%M%S}.json'
+        )
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+
+    def catalog(self, options, rng):
+        """(vectors, product_ids) from a fixture, the database or the synthetic generator"""
+        if options['fixture']:
+            vectors = np.load(options['fixture'], mmap_mode='r')
+            return vectors, np.arange(vectors.shape[0]) // max(1, options['images_per_product'])
+        if options['source'] == 'database':
+            index = VectorIndex.from_database()
+            return index.matrix, index.row_product_ids
+
+        # Clustered embeddings: products share a cluster, their images vary around it
+        n = options['n']
+        per_product = max(1, options['images_per_product'])
+        product_ids = np.arange(n) // per_product
+        centres = rng.standard_normal((options['clusters'], FEATURE_DIM)).astype(np.float32)
+        product_centres = rng.integers(options['clusters'], size=product_ids[-1] + 1 if n else 0)
+        vectors = np.empty((n, FEATURE_DIM), dtype=np.float32)
+        for start in range(0, n, 50000):
+            stop = min(start + 50000, n)
+            noise = rng.standard_normal((stop - start, FEATURE_DIM), dtype=np.float32)
+            vectors[start:stop] = centres[product_centres[product_ids[start:stop]]] + 0.6 * noise
+        return vectors, product_ids
+
+    @staticmethod
+    def all_active(product_ids):
+        attributes = ProductAttributes(product_ids)
+        attributes.active[:] = True
+        return attributes
+
+    @staticmethod
+    def make_queries(matrix, rng, count, noise):
+        rows = rng.choice(matrix.shape[0], min(count, matrix.shape[0]), replace=False)
+        queries = matrix[rows] + noise * rng.standard_normal((rows.shape[0], matrix.shape[1]), dtype=np.float32)
+        return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+    def build_ann(self, exact, rng, options):
+        nlist = min(options['nlist'] or max(1, int(4 * np.sqrt(len(exact)))), len(exact))
+        train_rows = rng.choice(len(exact), min(options['train_size'], len(exact)), replace=False)
+        self.stdout.write(f'Training IVF-PQ on {len(train_rows)} vectors (nlist={nlist}, m={options["m"]})')
+        started = time.perf_counter()
+        ivfpq = IVFPQIndex(exact.dim, nlist=nlist, m=options['m'])
+        ivfpq.train(exact.matrix[train_rows], iterations=options['iterations'])
+        ivfpq.add(exact.matrix, exact.row_product_ids)
+        approximate = ApproximateIndex(ivfpq, exact, rerank=options['rerank'])
+        approximate._attributes = exact.attributes
+        return approximate, time.perf_counter() - started
+
+    @staticmethod
+    def timed(search, queries):
+        """Latency percentiles and throughput of ``search`` over ``queries``, plus its results"""
+        for query in queries[:10]:
+            search(query)
+
+        timings = np.empty(len(queries))
+        found = []
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+        for i, query in enumerate(queries):
+            started = time.perf_counter()
+            found.append([product_id for product_id, _ in search(query)])
+            timings[i] = time.perf_counter() - started
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+
+        return {
+            'p50_ms': round(float(np.percentile(timings, 50)) * 1000, 3),
+            'p95_ms': round(float(np.percentile(timings, 95)) * 1000, 3),
+            'p99_ms': round(float(np.percentile(timings, 99)) * 1000, 3),
+            'qps': round(len(queries) / wall, 1) if wall else None,
+            # CPU time includes any BLAS helper threads, so this is per busy core
+            'qps_per_core': round(len(queries) / cpu, 1) if cpu else None,
+        }, found
+
+    def report(self, run):
+        label = 'exact' if run['method'] == 'exact' else f'nprobe={run["nprobe"]}'
+        self.stdout.write(
+            f'k={run["k"]:<3} {label:>11}  recall={run["recall"]:.3f}  p50={run["p50_ms"]:.2f}ms  '
+            f'p95={run["p95_ms"]:.2f}ms  p99={run["p99_ms"]:.2f}ms  qps/core={run["qps_per_core"]}'
+        )
+
+    @staticmethod
+    def nbytes(*arrays):
+        return int(sum(array.nbytes for array in arrays if array is not None))
@@ -0,0 +1,82 @@
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.image_search.ann import IVFPQIndex
+from apps.image_search.vector_index import VectorIndex, reset_index
+
+
+class Command(BaseCommand):
+    help = 'Train and save the IVF-PQ approximate index over product image feature vectors.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nlist', type=int, default=0, help='Coarse centroids (default: 4 * sqrt(N))')
+        parser.add_argument('--m', type=int, default=16, help='PQ sub-quantizers (one byte each)')
+        parser.add_argument('--nprobe', type=int, default=settings.IMAGE_SEARCH_NPROBE, help='Default lists probed per query')
+        parser.add_argument('--train-size', type=int, default=100000, help='Vectors sampled for training')
+        parser.add_argument('--iterations', type=int, default=20, help='k-means iterations')
+        parser.add_argument('--output', default=settings.IMAGE_SEARCH_INDEX_PATH, help='Where to write the index')
+        parser.add_argument('--queries', type=int, default=200, help='Sampled queries for the recall report (0 to skip)')
+        parser.add_argument('--k', type=int, default=10, help='k for recall@k')
+        parser.add_argument('--report-nprobe', default='1,2,4,8,16,32,64', help='nprobe values in the report')
+
+    def handle(self, *args, **options):
+        exact = VectorIndex.from_database()
+        vectors = exact.matrix
+        if not len(exact):
+            raise CommandError('No product image feature vectors to index.')
+
+        nlist = options['nlist'] or max(1, int(4 * np.sqrt(len(exact))))
+        nlist = min(nlist, len(exact))
+        rng = np.random.default_rng(0)
+        train_rows = rng.choice(len(exact), min(options['train_size'], len(exact)), replace=False)
+
+        self.stdout.write(f'Training on {len(train_rows)} of {len(exact)} vectors (nlist={nlist}, m={options["m"]})')
+        started = time.perf_counter()
+        index = IVFPQIndex(exact.dim, nlist=nlist, m=options['m'], nprobe=options['nprobe'])
+        index.train(vectors[train_rows], iterations=options['iterations'])
+        index.add(vectors, exact.row_product_ids)
+        self.stdout.write(f'Built in {time.perf_counter() - started:.1f}s')
+
+        if options['queries']:
+            nprobes = [int(value) for value in options['report_nprobe'].split(',') if value]
+            self.report(index, vectors, rng, options['queries'], options['k'], nprobes)
+
+        output = options['output']
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        index.save(output)
+        reset_index()
+        self.stdout.write(self.style.SUCCESS(f'Saved index of {len(index)} vectors to {output}'))
+        if not getattr(settings, 'IMAGE_SEARCH_USE_ANN', False):
+            self.stdout.write('IMAGE_SEARCH_USE_ANN is off, so searches still scan every vector.')
+
+    def report(self, index, vectors, rng, num_queries, k, nprobes):
+        """Recall@k and latency of the ANN index against exact search"""
+        queries = vectors[rng.choice(vectors.shape[0], min(num_queries, vectors.shape[0]), replace=False)]
+        k = min(k, vectors.shape[0])
+
+        truth = []
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            scores = vectors @ query
+            top = np.argpartition(-scores, k - 1)[:k]
+            timings.append(time.perf_counter() - started)
+            truth.append(set(top.tolist()))
+        self.stdout.write(f'{"exact":>10}  recall@{k}=1.000  p50={np.percentile(timings, 50) * 1000:.2f}ms  '
+                          f'p95={np.percentile(timings, 95) * 1000:.2f}ms')
+
+        for nprobe in nprobes:
+            hits = 0
+            timings = []
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                positions, _ = index.search_vectors(query, k, nprobe=nprobe)
+                timings.append(time.perf_counter() - started)
+                hits += len(expected.intersection(positions.tolist()))
+            self.stdout.write(f'{"nprobe=" + str(nprobe):>10}  recall@{k}={hits / (k * len(queries)):.3f}  '
+                              f'p50={np.percentile(timings, 50) * 1000:.2f}ms  '
+                              f'p95={np.percentile(timings, 95) * 1000:.2f}ms')
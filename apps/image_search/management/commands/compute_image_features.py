@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from apps.image_search.image_processor import process_image
+from apps.image_search.vector_index import reset_index
+from apps.products.models import ProductImage
+
+
+def extract_features(item):
+    """Worker: (pk, path) -> (pk, vector or None)"""
+    pk, path = item
+    try:
+        return pk, process_image(path)
+    except (OSError, ValueError):
+        return pk, None
+
+
+class Command(BaseCommand):
+    help = 'Compute feature vectors for product images in parallel, resuming from the last checkpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows read and written per batch')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Extraction processes')
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(os.path.dirname(settings.IMAGE_SEARCH_INDEX_PATH), 'compute_image_features.checkpoint'),
+            help='File recording the last primary key written',
+        )
+        parser.add_argument('--recompute', action='store_true', help='Also redo images that already have a vector')
+        parser.add_argument('--reset', action='store_true', help='Ignore the checkpoint and start from the beginning')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = max(1, options['workers'])
+        checkpoint = options['checkpoint']
+
+        last_pk = 0 if options['reset'] else self.read_checkpoint(checkpoint)
+        if last_pk:
+            self.stdout.write(self.style.NOTICE(f'Resuming after pk {last_pk}'))
+
+        queryset = ProductImage.objects.filter(pk__gt=last_pk).exclude(image='')
+        if not options['recompute']:
+            queryset = queryset.filter(feature_vector__isnull=True)
+        rows = (
+            (pk, default_storage.path(name))
+            for pk, name in queryset.order_by('pk').values_list('pk', 'image').iterator(chunk_size=chunk_size)
+        )
+
+        self.done = self.failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep one batch extracting while the previous one is written
+            pending = None
+            while True:
+                batch = list(islice(rows, chunk_size))
+                if not batch:
+                    break
+                results = executor.map(extract_features, batch, chunksize=max(1, len(batch) // (workers * 4)))
+                if pending:
+                    self.write_batch(*pending, checkpoint)
+                pending = (batch, results)
+            if pending:
+                self.write_batch(*pending, checkpoint)
+
+        # A finished run needs no checkpoint; new images are picked up by the null filter
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        reset_index()
+        self.stdout.write(self.style.SUCCESS(f'Done: {self.done} images processed, {self.failed} could not be read'))
+
+    def write_batch(self, batch, results, checkpoint):
+        updates = []
+        for pk, vector in results:
+            if vector is None:
+                self.failed += 1
+                self.stdout.write(self.style.WARNING(f'Could not read image {pk}'))
+                continue
+            updates.append(ProductImage(pk=pk, feature_vector=vector))
+        ProductImage.objects.bulk_update(updates, ['feature_vector'])
+
+        self.done += len(updates)
+        self.write_checkpoint(checkpoint, batch[-1][0])
+        self.stdout.write(f'{self.done} images processed (last pk {batch[-1][0]})')
+
+    @staticmethod
+    def read_checkpoint(path):
+        try:
+            with open(path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def write_checkpoint(path, pk):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(pk))
+        os.replace(tmp_path, path)
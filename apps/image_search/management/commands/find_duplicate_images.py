@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.image_search.duplicates import PRODUCT, PRODUCT_IMAGE, HashIndex, reset_hash_index
+from apps.image_search.image_processor import image_phash
+from apps.products.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Report groups of near-duplicate product images by perceptual hash.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--radius', type=int, default=settings.IMAGE_SEARCH_DUPLICATE_RADIUS,
+                            help='Max differing hash bits')
+        parser.add_argument('--backfill', action='store_true', help='Hash images that have no phash yet')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows hashed per batch when backfilling')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.backfill(ProductImage.objects.exclude(image=''), options['chunk_size'])
+            self.backfill(Product.objects.exclude(image='').exclude(image__isnull=True), options['chunk_size'])
+            reset_hash_index()
+
+        index = HashIndex.from_database()
+        radius = options['radius']
+
+        # Union-find over every pair found within the radius
+        parent = {key: key for key in index.hashes}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for key, value in index.hashes.items():
+            for _, (other, _) in index.tree.search(value, radius):
+                if other != key:
+                    parent[find(other)] = find(key)
+
+        groups = {}
+        for key in index.hashes:
+            groups.setdefault(find(key), []).append(key)
+        duplicates = [sorted(group) for group in groups.values() if len(group) > 1]
+
+        names = self.image_names()
+        for group in duplicates:
+            self.stdout.write(self.style.WARNING(f'{len(group)} near-duplicates:'))
+            for kind, pk in group:
+                self.stdout.write(f'  {kind} {pk}: {names.get((kind, pk), "")}')
+
+        redundant = sum(len(group) - 1 for group in duplicates)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(index.hashes)} hashed images, {len(duplicates)} duplicate groups, {redundant} redundant copies'
+        ))
+
+    def backfill(self, queryset, chunk_size):
+        model = queryset.model
+        last_pk = 0
+        hashed = 0
+        while True:
+            chunk = list(queryset.filter(phash='', pk__gt=last_pk).order_by('pk').only('pk', 'image')[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            updated = []
+            for obj in chunk:
+                try:
+                    obj.phash = image_phash(obj.image.path)
+                except (OSError, ValueError):
+                    self.stdout.write(self.style.WARNING(f'Could not read {model.__name__} {obj.pk}: {obj.image.name}'))
+                    continue
+                updated.append(obj)
+            model.objects.bulk_update(updated, ['phash'])
+            hashed += len(updated)
+        self.stdout.write(f'Hashed {hashed} {model.__name__} images')
+
+    @staticmethod
+    def image_names():
+        names = {}
+        for pk, name in ProductImage.objects.exclude(phash='').values_list('pk', 'image').iterator(chunk_size=5000):
+            names[(PRODUCT_IMAGE, pk)] = name
+        for pk, name in Product.objects.exclude(phash='').values_list('pk', 'image').iterator(chunk_size=5000):
+            names[(PRODUCT, pk)] = name
+        return names
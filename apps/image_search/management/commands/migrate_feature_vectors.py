@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.image_search.fields import DTYPE_CODES, encode_vector
+from apps.image_search.vector_index import reset_index
+from apps.products.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Move JSON feature vectors of product images into the binary feature_vector column, in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows converted per transaction')
+        parser.add_argument('--dtype', choices=sorted(DTYPE_CODES), default='float32', help='Stored precision')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dtype = options['dtype']
+        pending = ProductImage.objects.filter(feature_vector_json__isnull=False).order_by('pk')
+
+        converted = skipped = 0
+        last_pk = 0
+        while True:
+            # Walk by primary key so an interrupted run simply continues
+            chunk = list(pending.filter(pk__gt=last_pk).only('pk', 'feature_vector', 'feature_vector_json')[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            for image in chunk:
+                vector = image.feature_vector_json
+                if isinstance(vector, list) and vector:
+                    image.feature_vector = encode_vector(vector, dtype)
+                    converted += 1
+                else:
+                    skipped += 1
+                image.feature_vector_json = None
+
+            with transaction.atomic():
+                ProductImage.objects.bulk_update(chunk, ['feature_vector', 'feature_vector_json'])
+            self.stdout.write(f'Converted {converted} vectors (last pk {last_pk})')
+
+        # bulk_update sends no signals: tell running servers to reload
+        reset_index()
+        self.stdout.write(self.style.SUCCESS(f'Done: {converted} converted, {skipped} empty vectors skipped'))
@@ -1,3 +1,26 @@
 from rest_framework import serializers
 
-# Create your serializers here.
\ No newline at end of file
+from apps.products.models import Product
+
+
+class ImageSearchSerializer(serializers.Serializer):
+    """Validates an image search upload and its catalog filters"""
+    file = serializers.FileField()
+    k = serializers.IntegerField(required=False, default=12, min_value=1, max_value=50)
+
+    # Same filters as ProductFilterView
+    category = serializers.IntegerField(required=False)
+    brand = serializers.IntegerField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    stock_status = serializers.ChoiceField(choices=Product.STOCK_STATUS_CHOICES, required=False)
+    min_rating = serializers.DecimalField(max_digits=3, decimal_places=2, required=False)
+
+    FILTER_FIELDS = ['category', 'brand', 'min_price', 'max_price', 'stock_status', 'min_rating']
+
+    def get_filters(self):
+        return {
+            field: self.validated_data[field]
+            for field in self.FILTER_FIELDS
+            if self.validated_data.get(field) is not None
+        }
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.products.models import Product, ProductImage
+from .duplicates import PRODUCT, PRODUCT_IMAGE, reset_hash_index, update_hash_index
+from .vector_index import reset_catalog, reset_index
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_vector_index(sender, **kwargs):
+    reset_index()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_filters(sender, update_fields=None, **kwargs):
+    # View counting saves only view_count, which no filter uses
+    if update_fields and set(update_fields) <= {'view_count'}:
+        return
+    reset_catalog()
+
+
+@receiver(post_save, sender=ProductImage)
+def index_image_hash(sender, instance, **kwargs):
+    update_hash_index(PRODUCT_IMAGE, instance.pk, instance.phash)
+
+
+@receiver(post_save, sender=Product)
+def index_product_hash(sender, instance, **kwargs):
+    update_hash_index(PRODUCT, instance.pk, instance.phash)
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Product)
+def drop_hash_index(sender, **kwargs):
+    reset_hash_index()
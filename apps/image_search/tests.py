@@ -1,3 +1,254 @@
-from django.test import TestCase
+import base64
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
\ No newline at end of file
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from PIL import Image
+
+from apps.categories.models import Category
+from apps.products.models import Product, ProductImage
+from .ann import IVFPQIndex
+from .cache import query_cache
+from .fields import VectorField, decode_vector, encode_vector
+from .image_processor import FEATURE_DIM
+from .vector_index import ApproximateIndex, ProductAttributes, VectorIndex
+from .workers import search_limiter
+
+DIM = 16
+
+
+def unit_vectors(count, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def all_active(product_ids):
+    attributes = ProductAttributes(product_ids)
+    attributes.active[:] = True
+    return attributes
+
+
+class IVFPQIndexTests(SimpleTestCase):
+    """IVF-PQ train/add/search, masking and persistence"""
+
+    def setUp(self):
+        self.vectors = unit_vectors(400)
+        self.labels = np.arange(400) // 2 + 1
+        self.index = IVFPQIndex(DIM, nlist=8, m=4, ksub=16, nprobe=8)
+        self.index.train(self.vectors, iterations=10)
+        self.index.add(self.vectors, self.labels)
+
+    def test_search_finds_stored_vectors(self):
+        self.assertEqual(len(self.index), 400)
+        self.assertEqual(self.index.offsets[-1], 400)
+        hits = sum(self.index.search(self.vectors[row], k=5)[0][0] == self.labels[row] for row in range(0, 400, 10))
+        self.assertGreaterEqual(hits, 36)
+        # One result per label, best first
+        results = self.index.search(self.vectors[0], k=10)
+        labels = [label for label, _ in results]
+        self.assertEqual(len(labels), len(set(labels)))
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_untrained_index_refuses_vectors(self):
+        with self.assertRaises(RuntimeError):
+            IVFPQIndex(DIM, m=4).add(self.vectors, self.labels)
+        with self.assertRaises(ValueError):
+            IVFPQIndex(DIM, m=5)
+
+    def test_allowed_mask_excludes_vectors(self):
+        allowed = self.labels % 2 == 0
+        positions, _ = self.index.search_vectors(self.vectors[2], k=50, allowed=allowed)
+        self.assertTrue(len(positions))
+        self.assertTrue(allowed[positions].all())
+        positions, scores = self.index.search_vectors(self.vectors[2], k=50, allowed=np.zeros(400, dtype=bool))
+        self.assertEqual((len(positions), len(scores)), (0, 0))
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.npz')
+            self.index.save(path)
+            loaded = IVFPQIndex.load(path)
+        self.assertEqual((loaded.dim, loaded.nlist, loaded.m, loaded.ksub, loaded.nprobe), (DIM, 8, 4, 16, 8))
+        for name in ('centroids', 'codebooks', 'codes', 'positions', 'offsets', 'labels'):
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(self.index, name))
+        self.assertEqual(loaded.search(self.vectors[7], k=5), self.index.search(self.vectors[7], k=5))
+
+
+class ApproximateIndexTests(SimpleTestCase):
+    """IVF-PQ shortlists re-ranked by exact scores"""
+
+    def setUp(self):
+        vectors = unit_vectors(300, seed=1)
+        product_ids = np.arange(300) // 3 + 1
+        self.exact = VectorIndex(vectors, product_ids, dim=DIM)
+        self.exact._attributes = all_active(self.exact.product_ids)
+
+        # Products 91-100 (the last 30 rows) were embedded after the file was built
+        self.ivfpq = IVFPQIndex(DIM, nlist=6, m=8).train(vectors[:270], iterations=10)
+        self.ivfpq.add(vectors[:270], product_ids[:270])
+        self.ivfpq.nprobe = self.ivfpq.nlist
+        self.approximate = ApproximateIndex(self.ivfpq, self.exact, rerank=4)
+        self.approximate._attributes = self.exact.attributes
+        self.queries = unit_vectors(20, seed=2)
+
+    def test_unindexed_products_are_scored_exactly(self):
+        self.assertEqual(self.approximate.product_ids[self.approximate.unindexed].tolist(), list(range(91, 101)))
+
+    def test_full_probe_returns_the_exact_top_k(self):
+        for query in self.queries:
+            expected = self.exact.search(query, k=5)
+            found = self.approximate.search(query, k=5)
+            self.assertEqual([product_id for product_id, _ in found], [product_id for product_id, _ in expected])
+            np.testing.assert_allclose([score for _, score in found], [score for _, score in expected], rtol=1e-5)
+
+    def test_products_never_indexed_are_found(self):
+        query = self.exact.matrix[self.exact.group_starts[-1]]
+        self.assertEqual(self.approximate.search(query, k=1)[0][0], 100)
+
+    def test_filters_apply_before_ranking(self):
+        self.exact.attributes.active[self.exact.product_ids % 2 == 1] = False
+        for query in self.queries[:5]:
+            found = self.approximate.search(query, k=5)
+            self.assertTrue(found)
+            self.assertTrue(all(product_id % 2 == 0 for product_id, _ in found))
+            self.assertEqual(found, self.exact.search(query, k=5))
+
+
+class VectorIndexTests(SimpleTestCase):
+    """Exact search scores each product by its best image"""
+
+    def test_products_score_by_their_best_image(self):
+        vectors = np.array([[1, 0, 0], [0, 1, 0], [0.6, 0.8, 0], [0, 0, 1]], dtype=np.float32)
+        index = VectorIndex(vectors, [7, 3, 7, 5], dim=3)
+        self.assertEqual(index.product_ids.tolist(), [3, 5, 7])
+        np.testing.assert_allclose(index.product_scores([0, 2, 0]), [1.0, 0.0, 0.8])
+        np.testing.assert_allclose(index.product_scores([0, 2, 0], slots=np.array([2, 0])), [0.8, 1.0])
+
+        index._attributes = all_active(index.product_ids)
+        results = index.search([1, 0.1, 0], k=2)
+        self.assertEqual([product_id for product_id, _ in results], [7, 3])
+        self.assertAlmostEqual(results[0][1], 1 / np.sqrt(1.01), places=5)
+        with self.assertRaises(ValueError):
+            index.product_scores([1, 0])
+
+
+class VectorFieldTests(TestCase):
+    """Binary vector encoding, in Python and through the database"""
+
+    def test_encode_decode_round_trip(self):
+        vector = np.linspace(-1, 1, FEATURE_DIM, dtype=np.float32)
+        data = encode_vector(vector)
+        self.assertEqual(len(data), 8 + 4 * FEATURE_DIM)
+        np.testing.assert_array_equal(decode_vector(data), vector)
+        np.testing.assert_allclose(decode_vector(encode_vector(vector, 'float16')), vector, atol=1e-3)
+        with self.assertRaises(ValueError):
+            decode_vector(b'XX' + data[2:])
+
+        field = VectorField()
+        np.testing.assert_array_equal(field.to_python(base64.b64encode(data).decode()), vector)
+        np.testing.assert_array_equal(field.to_python(vector.tolist()), vector)
+        with self.assertRaises(ValidationError):
+            field.to_python(b'not a vector')
+
+    def test_database_round_trip(self):
+        category = Category.objects.create(name='Audio')
+        product = Product.objects.create(name='Speaker', description='', price=Decimal('5'), category=category,
+                                         sku='SP-9', stock=1)
+        # bulk_create skips ProductImage.save(), which would read the (absent) file
+        image = ProductImage.objects.bulk_create([ProductImage(product=product, image='products/a.png',
+                                                               is_primary=True)])[0]
+        vector = np.random.default_rng(0).standard_normal(FEATURE_DIM).astype(np.float32)
+        ProductImage.objects.filter(pk=image.pk).update(feature_vector=vector)
+        stored = ProductImage.objects.get(pk=image.pk).feature_vector
+        self.assertEqual(stored.dtype, np.float32)
+        np.testing.assert_array_equal(stored, vector)
+        self.assertIsNone(ProductImage.objects.filter(pk=image.pk).values_list('feature_vector_json', flat=True)[0])
+
+
+class ImageSearchViewTests(TransactionTestCase):
+    """Upload search: catalog filters, result cache and in-flight limit
+
+    The async view reads the catalog from a worker thread, which cannot see
+    rows inside a TestCase transaction.
+    """
+
+    def setUp(self):
+        audio = Category.objects.create(name='Audio')
+        home = Category.objects.create(name='Home')
+        self.speaker = Product.objects.create(
+            name='Speaker', description='', price=Decimal('50'), category=audio, sku='SP-1', stock=20,
+            rating_average=Decimal('4.5'),
+        )
+        self.radio = Product.objects.create(
+            name='Radio', description='', price=Decimal('20'), category=audio, sku='RA-1', stock=0,
+        )
+        self.lamp = Product.objects.create(
+            name='Lamp', description='', price=Decimal('30'), category=home, sku='LA-1', stock=5,
+        )
+        self.retired = Product.objects.create(
+            name='Old Lamp', description='', price=Decimal('10'), category=home, sku='OL-1', stock=5,
+            is_active=False,
+        )
+        query_cache.clear()
+        rng = np.random.default_rng(0)
+        self.query = rng.standard_normal(FEATURE_DIM).astype(np.float32)
+        products = [self.speaker, self.radio, self.radio, self.lamp, self.retired]
+        # Closest first: retired, speaker, radio's second image, lamp
+        vectors = [self.query + noise * rng.standard_normal(FEATURE_DIM).astype(np.float32)
+                   for noise in (0.1, 2.0, 0.3, 0.5, 0.01)]
+        self.index = VectorIndex(np.stack(vectors), [product.pk for product in products])
+        self.run_in_pool = mock.AsyncMock(return_value=self.query)
+        for target, value in (('loaded_index', mock.Mock(return_value=self.index)),
+                              ('run_in_pool', self.run_in_pool)):
+            patcher = mock.patch(f'apps.image_search.views.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def upload(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), (200, 40, 40)).save(buffer, 'PNG')
+        return SimpleUploadedFile('query.png', buffer.getvalue(), content_type='image/png')
+
+    def search(self, **params):
+        response = self.client.post('/api/image-search/', {'file': self.upload(), **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_filters_limit_products_before_ranking(self):
+        self.assertEqual(self.search(k=3), [self.speaker.pk, self.radio.pk, self.lamp.pk])
+        self.assertEqual(self.search(category=self.lamp.category_id), [self.lamp.pk])
+        self.assertEqual(self.search(max_price='25'), [self.radio.pk])
+        self.assertEqual(self.search(stock_status='in_stock', min_rating='4'), [self.speaker.pk])
+
+        attributes = ProductAttributes.from_database(self.index.product_ids)
+        self.assertEqual(attributes.active.tolist(), [True, True, True, False])
+        mask = attributes.mask({'category': self.speaker.category_id, 'min_price': Decimal('30')})
+        self.assertEqual(self.index.product_ids[mask].tolist(), [self.speaker.pk])
+
+    def test_repeat_uploads_are_served_from_the_cache(self):
+        hits = query_cache.hits
+        first = self.search(k=2)
+        with self.assertNumQueries(1):
+            # Only the page of products is read; no decode, index load or scoring
+            self.assertEqual(self.search(k=2), first)
+        self.assertEqual(self.run_in_pool.await_count, 1)
+        self.assertEqual(query_cache.hits - hits, 1)
+
+        # Other parameters are other queries
+        self.search(k=3)
+        self.assertEqual(self.run_in_pool.await_count, 2)
+
+    def test_busy_searches_get_503(self):
+        with mock.patch.object(search_limiter, 'running', search_limiter.limit):
+            response = self.client.post('/api/image-search/', {'file': self.upload()})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.run_in_pool.assert_not_awaited()
+        self.assertEqual(search_limiter.running, 0)
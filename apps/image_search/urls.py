@@ -1,9 +1,7 @@
-from django.urls import path, include
-from rest_framework.routers import DefaultRouter
+from django.urls import path
 from . import views
 
-router = DefaultRouter()
-
 urlpatterns = [
-    path('', include(router.urls)),
-]
\ No newline at end of file
+    path('', views.image_search, name='image-search'),
+    path('stats/', views.ImageSearchStatsView.as_view(), name='image-search-stats'),
+]
@@ -0,0 +1,385 @@
+# In-memory similarity index over ProductImage.feature_vector
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from apps.products.models import Product, ProductImage
+from apps.products.search import catalog_signature
+from utils.cache import bump_generation, get_generations
+from .ann import IVFPQIndex
+from .image_processor import FEATURE_DIM
+
+STOCK_STATUS_CODES = {value: code for code, (value, _) in enumerate(Product.STOCK_STATUS_CHOICES)}
+
+
+class ProductAttributes:
+    """
+    Filterable catalog columns for a sorted array of product ids, so that
+    image-search filters become boolean masks over the product axis
+    """
+
+    def __init__(self, product_ids):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        size = self.product_ids.shape[0]
+        self.active = np.zeros(size, dtype=bool)
+        self.category = np.full(size, -1, dtype=np.int64)
+        self.brand = np.full(size, -1, dtype=np.int64)
+        self.stock_status = np.full(size, -1, dtype=np.int8)
+        self.price = np.full(size, np.nan)
+        self.rating = np.full(size, np.nan)
+        # Shared 'product' generation the columns were read under (None: unknown)
+        self.generation = None
+        self._equality_masks = {}
+
+    @classmethod
+    def from_database(cls, product_ids):
+        attributes = cls(product_ids)
+        rows = list(Product.objects.values_list(
+            'id', 'is_active', 'category_id', 'brand_id', 'price', 'stock_status', 'rating_average'
+        ).iterator(chunk_size=5000))
+        if not rows or not len(attributes.product_ids):
+            return attributes
+
+        ids, active, category, brand, price, stock_status, rating = zip(*rows)
+        ids = np.array(ids, dtype=np.int64)
+        slots = np.searchsorted(attributes.product_ids, ids)
+        slots[slots == len(attributes.product_ids)] = 0
+        found = attributes.product_ids[slots] == ids
+        slots = slots[found]
+
+        def pick(values):
+            return [value for value, keep in zip(values, found) if keep]
+
+        attributes.active[slots] = pick(active)
+        attributes.category[slots] = pick(category)
+        attributes.brand[slots] = [-1 if value is None else value for value in pick(brand)]
+        attributes.stock_status[slots] = [STOCK_STATUS_CODES.get(value, -1) for value in pick(stock_status)]
+        attributes.price[slots] = [float(value) for value in pick(price)]
+        attributes.rating[slots] = [float(value) for value in pick(rating)]
+        return attributes
+
+    def _equals(self, field, value):
+        key = (field, value)
+        mask = self._equality_masks.get(key)
+        if mask is None:
+            mask = self._equality_masks[key] = getattr(self, field) == value
+        return mask
+
+    def mask(self, filters):
+        """Products passing ``filters`` (same keys as ProductFilterView)"""
+        mask = self.active.copy()
+        if filters.get('category') is not None:
+            mask &= self._equals('category', filters['category'])
+        if filters.get('brand') is not None:
+            mask &= self._equals('brand', filters['brand'])
+        if filters.get('stock_status'):
+            mask &= self._equals('stock_status', STOCK_STATUS_CODES.get(filters['stock_status'], -2))
+        if filters.get('min_price') is not None:
+            mask &= self.price >= float(filters['min_price'])
+        if filters.get('max_price') is not None:
+            mask &= self.price <= float(filters['max_price'])
+        if filters.get('min_rating') is not None:
+            mask &= self.rating >= float(filters['min_rating'])
+        return mask
+
+
+class CatalogFilterMixin:
+    """Lazily loaded ProductAttributes for the index's ``product_ids``"""
+    _attributes = None
+
+    @property
+    def attributes(self):
+        attributes = self._attributes
+        if attributes is None:
+            # Read first, so writes made while loading show up as a newer generation
+            generation = get_generations(['product'])[0]
+            attributes = ProductAttributes.from_database(self.product_ids)
+            attributes.generation = generation
+            self._attributes = attributes
+        return attributes
+
+    def reset_attributes(self):
+        self._attributes = None
+
+
+class VectorIndex(CatalogFilterMixin):
+    """
+    Contiguous float32 matrix of L2-normalised image embeddings.
+
+    Rows are grouped by product so that the best image score of every
+    product can be taken with a single ``np.maximum.reduceat`` after the
+    query matmul.
+    """
+
+    def __init__(self, vectors, product_ids, dim=FEATURE_DIM):
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, dim)
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+
+        # Group rows by product (stable so image order is preserved)
+        order = np.argsort(product_ids, kind='stable')
+        matrix = matrix[order]
+        product_ids = product_ids[order]
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+        self.dim = dim
+        self.matrix = matrix
+        self.row_product_ids = product_ids
+        if len(product_ids):
+            boundaries = np.flatnonzero(np.diff(product_ids)) + 1
+            self.group_starts = np.concatenate(([0], boundaries))
+        else:
+            self.group_starts = np.empty(0, dtype=np.intp)
+        self.product_ids = product_ids[self.group_starts]
+
+    @classmethod
+    def from_database(cls):
+        """Load every usable feature vector of active products"""
+        rows = (
+            ProductImage.objects
+            .filter(feature_vector__isnull=False, product__is_active=True)
+            .values_list('product_id', 'feature_vector')
+            .iterator(chunk_size=2000)
+        )
+        vectors = []
+        product_ids = []
+        for product_id, vector in rows:
+            # Skip embeddings produced by a different extractor
+            if vector.shape[0] != FEATURE_DIM:
+                continue
+            vectors.append(vector)
+            product_ids.append(product_id)
+        if not vectors:
+            return cls(np.empty((0, FEATURE_DIM), dtype=np.float32), product_ids)
+        # Single copy of the zero-copy row views into one matrix
+        return cls(np.stack(vectors).astype(np.float32, copy=False), product_ids)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def product_scores(self, vector, slots=None):
+        """Cosine similarity of the query against every product (best image), or only those at ``slots``"""
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        if query.shape[0] != self.dim:
+            raise ValueError(f'Expected a vector of length {self.dim}, got {query.shape[0]}')
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        if slots is None:
+            scores = self.matrix @ query
+            return np.maximum.reduceat(scores, self.group_starts)
+        if not len(slots):
+            return np.empty(0, dtype=np.float32)
+
+        # Rows of the selected products, still grouped by product
+        ends = np.append(self.group_starts[1:], len(self))
+        starts = self.group_starts[slots]
+        lengths = ends[slots] - starts
+        group_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        rows = np.arange(lengths.sum()) + np.repeat(starts - group_starts, lengths)
+        return np.maximum.reduceat(self.matrix[rows] @ query, group_starts)
+
+    def search(self, vector, k=12, filters=None):
+        """Return up to ``k`` ``(product_id, score)`` pairs, best first"""
+        if not len(self) or k <= 0:
+            return []
+        scores = self.product_scores(vector)
+
+        # Filter before ranking so every returned slot is a usable product
+        mask = self.attributes.mask(filters or {})
+        k = min(k, int(mask.sum()))
+        if not k:
+            return []
+        scores[~mask] = -np.inf
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.product_ids[i]), float(scores[i])) for i in top]
+
+
+class ApproximateIndex(CatalogFilterMixin):
+    """
+    Filtered product search that shortlists ``rerank * k`` products from a
+    saved IVFPQIndex and ranks them by their exact scores in ``exact``.
+    Products whose vectors the IVF-PQ file does not hold in full (embedded
+    or deactivated since build_image_index ran) are always scored exactly.
+    """
+
+    def __init__(self, ivfpq, exact, rerank=4):
+        self.ivfpq = ivfpq
+        self.exact = exact
+        self.rerank = max(1, rerank)
+        self.product_ids = exact.product_ids
+
+        # Slot in product_ids of every stored vector's product; -1 when it has none
+        labels = ivfpq.labels
+        slots = np.searchsorted(self.product_ids, labels)
+        known = slots < len(self.product_ids)
+        known[known] = self.product_ids[slots[known]] == labels[known]
+        self.slots = np.where(known, slots, -1)
+
+        indexed = np.bincount(self.slots[known], minlength=len(self.product_ids))
+        stored = np.diff(np.append(exact.group_starts, len(exact)))
+        self.unindexed = np.flatnonzero(indexed != stored)
+
+    def __len__(self):
+        return len(self.exact)
+
+    def search(self, vector, k=12, filters=None):
+        """Return up to ``k`` ``(product_id, score)`` pairs, best first"""
+        if not len(self) or k <= 0:
+            return []
+        mask = self.attributes.mask(filters or {})
+        allowed = np.zeros(len(self.ivfpq), dtype=bool)
+        known = self.slots >= 0
+        allowed[known] = mask[self.slots[known]]
+
+        candidates = self.ivfpq.search(vector, k * self.rerank, allowed=allowed)
+        slots = np.searchsorted(self.product_ids, [label for label, _ in candidates]).astype(np.intp)
+        slots = np.union1d(slots, self.unindexed[mask[self.unindexed]])
+        if not len(slots):
+            return []
+        scores = self.exact.product_scores(vector, slots)
+
+        k = min(k, len(slots))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.product_ids[slots[i]]), float(scores[i])) for i in top]
+
+
+_index = None
+_index_version = 0
+_signatures = None
+_checked_at = 0.0
+_index_lock = threading.Lock()
+_check_lock = threading.Lock()
+
+
+def load_index():
+    """
+    Exact search over the database vectors, or when IMAGE_SEARCH_USE_ANN is
+    set and build_image_index has written its file, IVF-PQ shortlists
+    re-ranked against those same vectors
+    """
+    exact = VectorIndex.from_database()
+    path = getattr(settings, 'IMAGE_SEARCH_INDEX_PATH', None)
+    if getattr(settings, 'IMAGE_SEARCH_USE_ANN', False) and path and os.path.exists(path):
+        ivfpq = IVFPQIndex.load(path)
+        if ivfpq.dim == exact.dim:
+            ivfpq.nprobe = getattr(settings, 'IMAGE_SEARCH_NPROBE', ivfpq.nprobe)
+            return ApproximateIndex(ivfpq, exact, rerank=getattr(settings, 'IMAGE_SEARCH_RERANK', 4))
+    return exact
+
+
+def vector_signature():
+    """
+    Summary of the stored embeddings and the ANN file that any process's
+    change moves: the shared 'image' generation (bumped by reset_index,
+    including from management commands), the index file's mtime and the
+    count and last id of images with a vector
+    """
+    path = getattr(settings, 'IMAGE_SEARCH_INDEX_PATH', None)
+    built = os.path.getmtime(path) if path and os.path.exists(path) else None
+    vectors = ProductImage.objects.filter(feature_vector__isnull=False).aggregate(count=Count('id'), last=Max('id'))
+    return get_generations(['image'])[0], built, vectors['count'], vectors['last']
+
+
+def _check_signatures():
+    """
+    Every IMAGE_SEARCH_CHECK_INTERVAL seconds, compare the signatures the
+    loaded index was built under with the current ones and drop what other
+    processes have changed: the whole index for new embeddings, only the
+    filter attributes for catalog edits
+    """
+    global _index, _index_version, _signatures, _checked_at
+    interval = getattr(settings, 'IMAGE_SEARCH_CHECK_INTERVAL', 30)
+    if _index is None or time.monotonic() - _checked_at < interval:
+        return
+    if not _check_lock.acquire(blocking=False):
+        return
+    try:
+        _checked_at = time.monotonic()
+        current = (vector_signature(), catalog_signature())
+        with _index_lock:
+            if _index is None or _signatures is None:
+                return
+            if current[0] != _signatures[0]:
+                _index = None
+                _index_version += 1
+            elif current[1] != _signatures[1]:
+                _index.reset_attributes()
+                _index_version += 1
+            _signatures = current
+    finally:
+        _check_lock.release()
+
+
+def _check_generations():
+    """
+    On every call (one cache read), drop what the shared generations show
+    any process has changed since it was loaded: the whole index after an
+    'image' bump, the filter attributes after a 'product' bump. Results
+    cached under index_version() then never come from older data.
+    """
+    global _index, _index_version
+    index = _index
+    if index is None or _signatures is None:
+        return
+    image, product = get_generations(['image', 'product'])
+    with _index_lock:
+        if _index is not index:
+            return
+        attributes = index._attributes
+        if image != _signatures[0][0]:
+            _index = None
+            _index_version += 1
+        elif attributes is not None and attributes.generation is not None and attributes.generation != product:
+            index.reset_attributes()
+            _index_version += 1
+
+
+def get_index():
+    """Return the process-wide index, loading it on first use and after other processes' changes"""
+    global _index, _signatures, _checked_at
+    _check_generations()
+    _check_signatures()
+    index = _index
+    if index is None:
+        with _index_lock:
+            if _index is None:
+                # Taken before loading, so changes made meanwhile show up at the next check
+                _signatures = (vector_signature(), catalog_signature())
+                _checked_at = time.monotonic()
+                _index = load_index()
+            index = _index
+    return index
+
+
+def index_version():
+    """Number bumped whenever embeddings or filterable columns change; part of cache keys"""
+    _check_generations()
+    _check_signatures()
+    return _index_version
+
+
+def reset_index():
+    """Drop the loaded index so the next search reloads it, here and (via the shared generation) elsewhere"""
+    global _index, _index_version
+    with _index_lock:
+        _index = None
+        _index_version += 1
+    bump_generation('image')
+
+
+def reset_catalog():
+    """Product columns changed: reload filter attributes but keep the vectors"""
+    global _index_version
+    with _index_lock:
+        if _index is not None:
+            _index.reset_attributes()
+        _index_version += 1
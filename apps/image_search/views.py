@@ -1,4 +1,101 @@
-from django.shortcuts import render
-from rest_framework import viewsets
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from PIL import UnidentifiedImageError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
\ No newline at end of file
+from apps.products.models import Product
+from apps.products.serializers import ProductSerializer
+from .cache import content_hash, query_cache
+from .image_processor import process_image_bytes
+from .serializers import ImageSearchSerializer
+from .vector_index import get_index, index_version
+from .workers import run_in_pool, search_limiter
+
+
+def loaded_index():
+    """The search index with its filter columns loaded (both read the database)"""
+    index = get_index()
+    index.attributes
+    return index
+
+
+def serialize_matches(request, matches):
+    products = Product.objects.filter(
+        id__in=[product_id for product_id, _ in matches], is_active=True
+    ).select_related('category', 'brand').in_bulk()
+
+    # Keep similarity order; products deactivated since indexing drop out
+    ranked = [(products[product_id], score) for product_id, score in matches if product_id in products]
+    serialized = ProductSerializer(
+        [product for product, _ in ranked], many=True, context={'request': request}
+    ).data
+
+    results = []
+    for data, (_, score) in zip(serialized, ranked):
+        data['similarity'] = round(score, 4)
+        results.append(data)
+    return results
+
+
+@csrf_exempt
+@require_POST
+async def image_search(request):
+    """
+    Find products whose images look most like the uploaded one
+
+    Decoding and feature extraction run in the worker process pool and
+    scoring in a thread, so the event loop keeps serving other requests.
+    Once IMAGE_SEARCH_MAX_INFLIGHT searches are running, new ones get 503.
+    """
+    data = request.POST.copy()
+    data.update(request.FILES)
+    query = ImageSearchSerializer(data=data)
+    if not query.is_valid():
+        return JsonResponse(query.errors, status=400)
+
+    if not search_limiter.try_acquire():
+        response = JsonResponse({'detail': 'Image search is busy, please retry shortly.'}, status=503)
+        response['Retry-After'] = '1'
+        return response
+
+    try:
+        upload = query.validated_data['file'].read()
+        k = query.validated_data['k']
+        filters = query.get_filters()
+
+        # Identical uploads against the same embeddings skip decode and search
+        filter_key = tuple(sorted((field, str(value)) for field, value in filters.items()))
+        cache_key = (content_hash(upload), index_version(), k, filter_key)
+        matches = query_cache.get(cache_key)
+        if matches is None:
+            try:
+                vector = await run_in_pool(process_image_bytes, upload)
+            except (UnidentifiedImageError, OSError):
+                return JsonResponse({'detail': 'Uploaded file is not a valid image.'}, status=400)
+            index = await sync_to_async(loaded_index)()
+            # NumPy releases the GIL during the matmul, so a plain thread suffices
+            matches = await sync_to_async(index.search, thread_sensitive=False)(vector, k=k, filters=filters)
+            query_cache.set(cache_key, matches)
+    finally:
+        search_limiter.release()
+
+    results = await sync_to_async(serialize_matches)(request, matches)
+    return JsonResponse({'count': len(results), 'results': results}, encoder=DjangoJSONEncoder)
+
+
+class ImageSearchStatsView(APIView):
+    """Index size and query cache counters"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({
+            'indexed_vectors': len(get_index()),
+            'index_version': index_version(),
+            'in_flight': search_limiter.running,
+            'cache': query_cache.stats(),
+        })
@@ -0,0 +1,49 @@
+# Process pool for CPU-bound image work, shared by the async search view
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide pool; spawned workers only import the image processor"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = getattr(settings, 'IMAGE_SEARCH_WORKERS', None) or min(4, os.cpu_count() or 1)
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+async def run_in_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), func, *args)
+
+
+class InflightLimiter:
+    """Counts running jobs and refuses new ones past ``limit``"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.running >= self.limit:
+                return False
+            self.running += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.running -= 1
+
+
+search_limiter = InflightLimiter(getattr(settings, 'IMAGE_SEARCH_MAX_INFLIGHT', 16))
@@ -0,0 +1,330 @@
+# In-memory bitmap index answering filtered, sorted product listings
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from rest_framework.response import Response
+
+from utils.cache import get_generations
+from .models import Brand, Product
+from .search import catalog_signature
+
+# Sort keys accepted by the listing views (ties broken by id)
+SORT_FIELDS = ('price', 'name', 'created_at', 'rating_average')
+DEFAULT_SORT = '-created_at'
+# Column a sort key orders by in SQL, when not its own: names sort on the
+# indexed name_key, in the database's collation
+SORT_COLUMNS = {'name': 'name_key'}
+
+
+def sort_ordering(sort_by):
+    """order_by() arguments of a ``sort_by`` from SORT_FIELDS (optionally '-' prefixed), ties by id"""
+    direction = '-' if sort_by.startswith('-') else ''
+    field = sort_by.lstrip('-')
+    return f'{direction}{SORT_COLUMNS.get(field, field)}', f'{direction}id'
+
+
+class SlotSet:
+    """
+    Sorted product slots of one attribute value. Like a roaring container,
+    values covering more than 1/32 of the catalog (where a bitmap is the
+    smaller encoding) also keep a packed bitmap for O(1) membership tests.
+    """
+
+    def __init__(self, slots, size):
+        self.slots = np.asarray(slots, dtype=np.int32)
+        self.bits = None
+        if self.slots.shape[0] * 32 > size:
+            mask = np.zeros(size, dtype=bool)
+            mask[self.slots] = True
+            self.bits = np.packbits(mask)
+
+    def __len__(self):
+        return self.slots.shape[0]
+
+    def contains(self, slots):
+        """Boolean membership of each of ``slots``"""
+        if self.bits is not None:
+            return ((self.bits[slots >> 3] >> (7 - (slots & 7))) & 1).astype(bool)
+        positions = np.searchsorted(self.slots, slots)
+        positions[positions == self.slots.shape[0]] = 0
+        return self.slots[positions] == slots
+
+
+class SortedColumn:
+    """Numeric column with its slots sorted by value, so ranges are one bisect"""
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.order = np.argsort(self.values, kind='stable').astype(np.int32)
+        self.sorted_values = self.values[self.order]
+
+    def range_slots(self, low=None, high=None):
+        start = 0 if low is None else np.searchsorted(self.sorted_values, low, side='left')
+        stop = len(self.order) if high is None else np.searchsorted(self.sorted_values, high, side='right')
+        return np.sort(self.order[start:stop])
+
+    def range_size(self, low=None, high=None):
+        start = 0 if low is None else np.searchsorted(self.sorted_values, low, side='left')
+        stop = len(self.order) if high is None else np.searchsorted(self.sorted_values, high, side='right')
+        return max(0, int(stop - start))
+
+    def contains(self, slots, low=None, high=None):
+        keep = np.ones(slots.shape[0], dtype=bool)
+        if low is not None:
+            keep &= self.values[slots] >= low
+        if high is not None:
+            keep &= self.values[slots] <= high
+        return keep
+
+
+class OrderedProducts:
+    """
+    Matching product ids in listing order. Supports ``len()`` and slicing;
+    a slice only partially sorts the matches up to its end.
+    """
+
+    def __init__(self, product_ids, ranks):
+        self.product_ids = product_ids
+        self.ranks = ranks
+
+    def __len__(self):
+        return self.product_ids.shape[0]
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop, _ = item.indices(len(self))
+        if start >= stop:
+            return []
+        if stop < len(self):
+            head = np.argpartition(self.ranks, stop - 1)[:stop]
+        else:
+            head = np.arange(len(self))
+        head = head[np.argsort(self.ranks[head], kind='stable')]
+        return self.product_ids[head[start:stop]].tolist()
+
+
+class CatalogIndex:
+    """
+    Filterable columns of every active product: one SlotSet per category,
+    brand, stock status, featured flag and in-stock flag value, sorted
+    price and rating columns for ranges, and precomputed sort ranks.
+    ``rows`` come in name order, i.e. the database's ``name_key, id`` order,
+    so name ranks match SQL sorts and keyset pages exactly.
+
+    A query starts from its smallest candidate set and tests the other
+    constraints against just those slots, so its cost follows the most
+    selective filter rather than the catalog size.
+    """
+
+    def __init__(self, rows, brand_slugs=None):
+        rows = list(rows)
+        size = len(rows)
+        self.size = size
+        self.brand_slugs = brand_slugs or {}
+        if rows:
+            ids, categories, brands, statuses, featured, stock, prices, ratings, created = zip(*rows)
+        else:
+            ids = categories = brands = statuses = featured = stock = prices = ratings = created = ()
+        self.product_ids = np.array(ids, dtype=np.int64)
+
+        self.sets = {
+            'category': self._group(categories),
+            'brand': self._group(brands),
+            'stock_status': self._group(statuses),
+            'is_featured': self._group(featured),
+            'in_stock': self._group(value > 0 for value in stock),
+        }
+        self.columns = {
+            'price': SortedColumn([float(value) for value in prices]),
+            'rating_average': SortedColumn([float(value) for value in ratings]),
+        }
+
+        # Position of every slot in each ascending sort order, ties by id
+        created_at = np.array([value.timestamp() for value in created], dtype=np.float64)
+        self.ranks = {
+            'price': self._ranks(self.columns['price'].values),
+            'rating_average': self._ranks(self.columns['rating_average'].values),
+            'created_at': self._ranks(created_at),
+            'name': np.arange(size, dtype=np.int64),
+        }
+
+    def _group(self, values):
+        slots = {}
+        for slot, value in enumerate(values):
+            slots.setdefault(value, []).append(slot)
+        return {value: SlotSet(members, self.size) for value, members in slots.items()}
+
+    def _ranks(self, values):
+        order = np.lexsort((self.product_ids, values))
+        ranks = np.empty(self.size, dtype=np.int64)
+        ranks[order] = np.arange(self.size)
+        return ranks
+
+    @classmethod
+    def from_database(cls):
+        rows = Product.objects.filter(is_active=True).values_list(
+            'id', 'category_id', 'brand_id', 'stock_status', 'is_featured', 'stock',
+            'price', 'rating_average', 'created_at',
+        ).order_by(*sort_ordering('name')).iterator(chunk_size=5000)
+        return cls(rows, dict(Brand.objects.values_list('slug', 'id')))
+
+    def __len__(self):
+        return self.size
+
+    def select(self, category=None, brand=None, brand_slug=None, stock_status=None, is_featured=None,
+               in_stock=None, min_price=None, max_price=None, min_rating=None):
+        """Sorted slots of active products passing every given filter"""
+        if brand_slug is not None:
+            brand = self.brand_slugs.get(brand_slug, -1)
+        equalities = [
+            self.sets[field].get(value)
+            for field, value in (
+                ('category', category), ('brand', brand), ('stock_status', stock_status),
+                ('is_featured', is_featured), ('in_stock', in_stock),
+            )
+            if value is not None
+        ]
+        if any(member is None for member in equalities):
+            return np.empty(0, dtype=np.int32)
+        ranges = [
+            (self.columns[field], low, high)
+            for field, low, high in (('price', min_price, max_price), ('rating_average', min_rating, None))
+            if low is not None or high is not None
+        ]
+
+        # Drive from the smallest candidate set
+        candidates = [(len(member), 'set', member) for member in equalities]
+        candidates += [(column.range_size(low, high), 'range', (column, low, high)) for column, low, high in ranges]
+        if not candidates:
+            return np.arange(self.size, dtype=np.int32)
+        _, kind, driver = min(candidates, key=lambda candidate: candidate[0])
+        slots = driver.slots if kind == 'set' else driver[0].range_slots(driver[1], driver[2])
+
+        for member in equalities:
+            if kind == 'set' and member is driver:
+                continue
+            slots = slots[member.contains(slots)]
+        for column, low, high in ranges:
+            if kind == 'range' and column is driver[0]:
+                continue
+            slots = slots[column.contains(slots, low, high)]
+        return slots
+
+    def ordered(self, slots, sort_by=DEFAULT_SORT):
+        """OrderedProducts for ``slots`` under a whitelisted ``sort_by``"""
+        field = sort_by.lstrip('-')
+        if field not in SORT_FIELDS:
+            field, sort_by = DEFAULT_SORT.lstrip('-'), DEFAULT_SORT
+        ranks = self.ranks[field][slots]
+        if sort_by.startswith('-'):
+            ranks = -ranks
+        return OrderedProducts(self.product_ids[slots], ranks)
+
+
+# Generations (utils.cache) the index content depends on
+CATALOG_ENTITIES = ('product', 'brand')
+
+_index = None
+_signature = None
+_generations = None
+_checked_at = 0.0
+_build_lock = threading.Lock()
+
+
+def get_catalog_index():
+    """
+    Process-wide CatalogIndex, or None while another thread is (re)building
+    it, in which case callers fall back to SQL. It is rebuilt as soon as
+    the shared product or brand generation moves past the one it was built
+    under, so other processes' writes show up on the next listing, and when
+    the catalog signature shows writes that bumped nothing.
+    """
+    global _index, _signature, _generations, _checked_at
+    index = _index
+    generations = get_generations(CATALOG_ENTITIES)
+    current = index is not None and generations == _generations
+    interval = getattr(settings, 'PRODUCT_CATALOG_CHECK_INTERVAL', 30)
+    if current and time.monotonic() - _checked_at < interval:
+        return index
+    if not _build_lock.acquire(blocking=False):
+        # Never answer from an index older than the generations responses are cached under
+        return index if current else None
+    try:
+        now = time.monotonic()
+        signature = catalog_signature()
+        if _index is None or _generations != generations or signature != _signature:
+            # Generations read before the build, so writes made meanwhile trigger another
+            _index = CatalogIndex.from_database()
+            _signature = signature
+            _generations = generations
+        _checked_at = now
+        return _index
+    finally:
+        _build_lock.release()
+
+
+def reset_catalog_index():
+    """Drop the loaded index so the next listing rebuilds it"""
+    global _index
+    _index = None
+
+
+def index_filters(cleaned_data):
+    """CatalogIndex.select arguments for validated ProductFilter data; None when it has a text search"""
+    if cleaned_data.get('search'):
+        return None
+    filters = {}
+    for name in ('category', 'brand'):
+        if cleaned_data.get(name) is not None:
+            filters[name] = int(cleaned_data[name])
+    for name in ('min_price', 'max_price', 'min_rating'):
+        if cleaned_data.get(name) is not None:
+            filters[name] = float(cleaned_data[name])
+    if cleaned_data.get('stock_status'):
+        filters['stock_status'] = cleaned_data['stock_status']
+    return filters
+
+
+class CatalogListMixin:
+    """
+    List view answered by the CatalogIndex: filtering and sorting happen
+    in memory and only the requested page of products is read from the
+    database. Views return None from ``catalog_filters`` for requests the
+    index cannot answer (e.g. text search), which use ``get_queryset``.
+    """
+
+    def catalog_filters(self):
+        raise NotImplementedError
+
+    def catalog_sort(self):
+        return self.request.query_params.get('sort_by', DEFAULT_SORT)
+
+    def catalog_queryset(self):
+        """Queryset the page's products are read from"""
+        return Product.objects.filter(is_active=True).select_related('category', 'brand')
+
+    def catalog_page(self, ids):
+        """Products to serialize for ``ids``, in that order"""
+        products = self.catalog_queryset().in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+    def list(self, request, *args, **kwargs):
+        filters = self.catalog_filters()
+        # Keyset (cursor) pages are range reads on the database's sort indexes
+        keyset = getattr(self.paginator, 'keyset_requested', None)
+        if filters is not None and keyset is not None and keyset(request):
+            filters = None
+        index = get_catalog_index() if filters is not None else None
+        if index is None:
+            return super().list(request, *args, **kwargs)
+
+        product_ids = index.ordered(index.select(**filters), self.catalog_sort())
+        page = self.paginate_queryset(product_ids)
+        ids = page if page is not None else product_ids[:]
+        serializer = self.get_serializer(self.catalog_page(ids), many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
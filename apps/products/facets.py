@@ -0,0 +1,132 @@
+# Facet counts for the product filter sidebar
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+
+from utils.cache import get_generations
+from utils.query_cache import QueryCache
+from .filters import ProductFilter
+from .models import Product
+
+# Filter parameters each facet ignores, so its own options keep their counts
+# while one of them is selected
+FACET_PARAMS = {
+    'category': ('category',),
+    'brand': ('brand',),
+    'stock_status': ('stock_status',),
+    'price': ('min_price', 'max_price'),
+    'rating': ('min_rating',),
+}
+
+RATING_THRESHOLDS = (4, 3, 2, 1)
+
+# Generations (utils.cache) the counts depend on
+FACET_ENTITIES = ('product', 'category', 'brand')
+
+facet_cache = QueryCache(
+    max_entries=getattr(settings, 'PRODUCT_FACET_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'PRODUCT_FACET_CACHE_TTL', 60),
+)
+
+
+def normalize_value(value):
+    if isinstance(value, Decimal):
+        return format(value.normalize(), 'f')
+    return str(value).strip()
+
+
+def clean_filters(params):
+    """Validated, normalized ProductFilter parameters that are actually set"""
+    filterset = ProductFilter(params, queryset=Product.objects.none())
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return {
+        name: normalize_value(value)
+        for name, value in filterset.form.cleaned_data.items()
+        if value not in (None, '')
+    }
+
+
+def facet_counts(params):
+    """
+    Counts per category, brand, stock status, price bucket and minimum
+    rating under ``params`` (ProductFilterView query parameters). Each
+    facet is one grouped or conditional aggregate query, and results are
+    cached per normalized filter key and catalog generation, so any
+    process's write (see products.signals) retires them.
+    """
+    filters = clean_filters(params)
+    key = (tuple(get_generations(FACET_ENTITIES)), tuple(sorted(filters.items())))
+    counts = facet_cache.get(key)
+    if counts is None:
+        counts = compute_facets(filters)
+        facet_cache.set(key, counts)
+    return counts
+
+
+def compute_facets(filters):
+    def narrowed(facet):
+        data = {name: value for name, value in filters.items() if name not in FACET_PARAMS[facet]}
+        return ProductFilter(data, queryset=Product.objects.filter(is_active=True)).qs
+
+    categories = list(
+        narrowed('category').values('category_id', 'category__name')
+        .annotate(count=Count('id')).order_by('-count', 'category__name')
+    )
+    brands = list(
+        narrowed('brand').exclude(brand__isnull=True).values('brand_id', 'brand__name')
+        .annotate(count=Count('id')).order_by('-count', 'brand__name')
+    )
+    statuses = dict(narrowed('stock_status').values_list('stock_status').annotate(count=Count('id')).order_by())
+
+    edges = [Decimal(0)] + [Decimal(str(edge)) for edge in getattr(
+        settings, 'PRODUCT_FACET_PRICE_BUCKETS', (25, 50, 100, 250, 500, 1000)
+    )]
+    buckets = list(zip(edges, edges[1:] + [None]))
+    price_counts = narrowed('price').aggregate(**{
+        f'bucket_{i}': Count('id', filter=Q(price__gte=low) & (Q(price__lt=high) if high is not None else Q()))
+        for i, (low, high) in enumerate(buckets)
+    })
+    rating_counts = narrowed('rating').aggregate(**{
+        f'rating_{threshold}': Count('id', filter=Q(rating_average__gte=threshold))
+        for threshold in RATING_THRESHOLDS
+    })
+
+    # Every product has a category, so the category facet also yields the total
+    if 'category' in filters:
+        total = sum(row['count'] for row in categories if str(row['category_id']) == filters['category'])
+    else:
+        total = sum(row['count'] for row in categories)
+
+    return {
+        'filters': filters,
+        'total': total,
+        'facets': {
+            'category': [
+                {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+                for row in categories
+            ],
+            'brand': [
+                {'id': row['brand_id'], 'name': row['brand__name'], 'count': row['count']}
+                for row in brands
+            ],
+            'stock_status': [
+                {'value': value, 'label': label, 'count': statuses.get(value, 0)}
+                for value, label in Product.STOCK_STATUS_CHOICES
+            ],
+            'price': [
+                {
+                    'min_price': normalize_value(low),
+                    'max_price': normalize_value(high) if high is not None else None,
+                    'count': price_counts[f'bucket_{i}'],
+                }
+                for i, (low, high) in enumerate(buckets)
+            ],
+            'rating': [
+                {'min_rating': threshold, 'count': rating_counts[f'rating_{threshold}']}
+                for threshold in RATING_THRESHOLDS
+            ],
+        },
+    }
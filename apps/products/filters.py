@@ -1,4 +1,28 @@
 import django_filters
+from django.db.models import Q
 from django_filters import rest_framework as filters
 
-# Create your filters here.
\ No newline at end of file
+from .models import Product
+
+
+class ProductFilter(filters.FilterSet):
+    """Query parameters of ProductFilterView, shared with the facet counts"""
+    category = django_filters.NumberFilter(field_name='category_id')
+    brand = django_filters.NumberFilter(field_name='brand_id')
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    stock_status = django_filters.ChoiceFilter(choices=Product.STOCK_STATUS_CHOICES)
+    min_rating = django_filters.NumberFilter(field_name='rating_average', lookup_expr='gte')
+    search = django_filters.CharFilter(method='filter_search')
+
+    class Meta:
+        model = Product
+        fields = []
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(
+            Q(name__icontains=value) |
+            Q(description__icontains=value) |
+            Q(category__name__icontains=value) |
+            Q(brand__name__icontains=value)
+        )
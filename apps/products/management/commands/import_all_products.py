@@ -6,6 +6,8 @@ from apps.categories.models import Category
 from django.core.files import File
 from django.conf import settings
 from django.utils.text import slugify
+from apps.image_search.duplicates import find_duplicate_product_image, find_identical_product_image
+from apps.image_search.image_processor import image_phash
 
 def parse_decimal(val, default=0.0):
     try:
@@ -74,10 +76,22 @@ class Command(BaseCommand):
                         sku=sku,
                         defaults=defaults
                     )
-                    # Set image if file exists
+                    # Set image if file exists, reusing an already stored identical file
                     if image_path and os.path.exists(image_path):
-                        with open(image_path, 'rb') as img_f:
-                            product.image.save(image_filename, File(img_f), save=True)
+                        phash = image_phash(image_path)
+                        identical = find_identical_product_image(phash, image_path)
+                        if identical is None:
+                            duplicate = find_duplicate_product_image(phash)
+                            if duplicate is not None and duplicate.pk != product.pk:
+                                self.stdout.write(self.style.WARNING(
+                                    f"Image for SKU {sku} looks like the image of product {duplicate.pk}"
+                                ))
+                            with open(image_path, 'rb') as img_f:
+                                product.image.save(image_filename, File(img_f), save=True)
+                        elif identical.pk != product.pk:
+                            product.image = identical.image.name
+                            product.phash = identical.phash
+                            product.save()
                     else:
                         self.stdout.write(self.style.WARNING(f"Image not found for SKU {sku}: {image_path}"))
                     self.stdout.write(self.style.SUCCESS(f"{'Created' if created else 'Updated'} product: {product.name}"))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:00
+
+import apps.image_search.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_image'),
+    ]
+
+    operations = [
+        # Keep the JSON embeddings until migrate_feature_vectors has copied them
+        migrations.RenameField(
+            model_name='productimage',
+            old_name='feature_vector',
+            new_name='feature_vector_json',
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='feature_vector',
+            field=apps.image_search.fields.VectorField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_productimage_binary_feature_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='phash',
+            field=models.CharField(blank=True, db_index=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='phash',
+            field=models.CharField(blank=True, db_index=True, max_length=16),
+        ),
+    ]
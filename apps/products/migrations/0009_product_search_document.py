@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+from apps.products.text import build_search_document
+
+
+def fill_search_documents(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    rows = Product.objects.values_list(
+        'id', 'name', 'short_description', 'description', 'sku', 'category__name', 'brand__name',
+    )
+    products = [
+        Product(id=row[0], search_document=build_search_document(*row[1:]))
+        for row in rows.iterator(chunk_size=2000)
+    ]
+    Product.objects.bulk_update(products, ['search_document'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_image_phash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+    ]
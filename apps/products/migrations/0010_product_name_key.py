@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+from apps.products.text import name_key
+
+
+def fill_name_keys(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    products = [
+        Product(id=product_id, name_key=name_key(name))
+        for product_id, name in Product.objects.values_list('id', 'name').iterator(chunk_size=2000)
+    ]
+    Product.objects.bulk_update(products, ['name_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0003_delete_product'),
+        ('products', '0010_product_name_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating_average'], name='products_pr_rating__5f951b_idx'),
+        ),
+    ]
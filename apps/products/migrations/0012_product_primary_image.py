@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_primary_images(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+    products = {}
+    for image in ProductImage.objects.filter(is_primary=True).order_by('-pk').iterator(chunk_size=2000):
+        # Lowest pk wins, as with .first()
+        products[image.product_id] = image
+    updated = []
+    for product_id, image in products.items():
+        try:
+            width, height = image.image.width, image.image.height
+        except (OSError, ValueError):
+            width = height = None
+        updated.append(Product(
+            id=product_id,
+            primary_image_id=image.pk,
+            primary_image_path=image.image.name,
+            primary_image_alt_text=image.alt_text,
+            primary_image_width=width,
+            primary_image_height=height,
+        ))
+    Product.objects.bulk_update(updated, [
+        'primary_image', 'primary_image_path', 'primary_image_alt_text',
+        'primary_image_width', 'primary_image_height',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_rating_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.productimage'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_alt_text',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_path',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_primary_images, migrations.RunPython.noop),
+    ]
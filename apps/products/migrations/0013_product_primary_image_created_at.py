@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:55
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_primary_image_created_at(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+    created_at = ProductImage.objects.filter(pk=OuterRef('primary_image_id')).values('created_at')[:1]
+    Product.objects.filter(primary_image__isnull=False).update(primary_image_created_at=Subquery(created_at))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_product_primary_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_created_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_primary_image_created_at, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.text import slugify
 from PIL import Image
 from .validators import validate_image_file_extension, validate_image_file_size
 from apps.categories.models import Category  # <-- Import Category from categories
+from apps.image_search.fields import VectorField
+from apps.image_search.image_processor import image_phash, load_image
+from .text import build_search_document, name_key
 from decimal import Decimal
 import os
 import csv
@@ -15,6 +19,17 @@ def to_float(val):
         return float(val)
     return 0.0
 
+def compute_phash(image, current=''):
+    """Hash newly uploaded images, or stored ones that were never hashed"""
+    if not image:
+        return ''
+    if current and image._committed:
+        return current
+    try:
+        return image_phash(image)
+    except (OSError, ValueError):
+        return current
+
 # Removed local Category model
 
 class Brand(models.Model):
@@ -45,6 +60,22 @@ class Product(models.Model):
     description = models.TextField()
     short_description = models.CharField(max_length=300, blank=True)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Perceptual hash of `image` for near-duplicate detection
+    phash = models.CharField(max_length=16, blank=True, db_index=True)
+    # Normalized tokens of the searchable fields, indexed by products.search
+    search_document = models.TextField(blank=True, editable=False)
+    # Normalized name; its index serves prefix matches as range scans
+    name_key = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    # Copy of the primary ProductImage, kept by sync_primary_image so list
+    # serializers never query the images table
+    primary_image = models.ForeignKey(
+        'ProductImage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False
+    )
+    primary_image_path = models.CharField(max_length=100, blank=True, editable=False)
+    primary_image_alt_text = models.CharField(max_length=200, blank=True, editable=False)
+    primary_image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_created_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -86,11 +117,22 @@ class Product(models.Model):
             models.Index(fields=['is_trending']),
             models.Index(fields=['price']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['rating_average']),
         ]
 
+    # Fields that feed search_document
+    SEARCH_SOURCE_FIELDS = {'name', 'short_description', 'description', 'sku', 'category', 'brand'}
+
     def __str__(self):
         return self.name
 
+    def build_search_document(self):
+        return build_search_document(
+            self.name, self.short_description, self.description, self.sku,
+            self.category.name if self.category_id else '',
+            self.brand.name if self.brand_id else '',
+        )
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -108,6 +150,15 @@ class Product(models.Model):
             self.stock_status = 'limited_stock'
         else:
             self.stock_status = 'in_stock'
+
+        update_fields = kwargs.get('update_fields')
+        if not update_fields:
+            self.phash = compute_phash(self.image, self.phash)
+        if not update_fields or self.SEARCH_SOURCE_FIELDS.intersection(update_fields):
+            self.search_document = self.build_search_document()
+            self.name_key = name_key(self.name)
+            if update_fields:
+                kwargs['update_fields'] = {*update_fields, 'search_document', 'name_key'}
             
         super().save(*args, **kwargs)
 
@@ -122,6 +173,12 @@ class Product(models.Model):
     def is_on_sale(self):
         return self.original_price and self.original_price > self.price
 
+    @property
+    def primary_image_url(self):
+        if not self.primary_image_path:
+            return None
+        return ProductImage._meta.get_field('image').storage.url(self.primary_image_path)
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(
@@ -130,9 +187,13 @@ class ProductImage(models.Model):
     )
     alt_text = models.CharField(max_length=200, blank=True)
     is_primary = models.BooleanField()
+    # Perceptual hash for near-duplicate detection
+    phash = models.CharField(max_length=16, blank=True, db_index=True)
     
     # For AI image search feature
-    feature_vector = models.JSONField(null=True, blank=True)
+    feature_vector = VectorField(null=True, blank=True)
+    # Legacy JSON embeddings, moved into feature_vector by migrate_feature_vectors
+    feature_vector_json = models.JSONField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -140,17 +201,44 @@ class ProductImage(models.Model):
         return f"Image for {self.product.name}"
 
     def save(self, *args, **kwargs):
+        # A phash given with a new image was computed from that upload (duplicate checks)
+        if not kwargs.get('update_fields') and not (self._state.adding and self.phash):
+            self.phash = compute_phash(self.image, self.phash)
         super().save(*args, **kwargs)
         
         # Resize image if too large
         if self.image:
             img_path = getattr(self.image, 'path', None)
             if img_path and os.path.exists(img_path):
-                img = Image.open(img_path)
-                if img.height > 800 or img.width > 800:
+                with Image.open(img_path) as img:
+                    too_large = img.height > 800 or img.width > 800
+                if too_large:
                     output_size = (800, 800)
-                    img.thumbnail(output_size)
-                    img.save(img_path)
+                    load_image(img_path, output_size).save(img_path)
+
+        sync_primary_image(self.product_id)
+
+def image_dimensions(image):
+    """(width, height) of a stored image, read from its header; (None, None) if unreadable"""
+    try:
+        return image.width, image.height
+    except (OSError, ValueError):
+        return None, None
+
+def sync_primary_image(product_id):
+    """Copy the product's primary image (id, path, alt text, dimensions and creation time) onto the product row"""
+    image = ProductImage.objects.filter(product_id=product_id, is_primary=True).first()
+    width, height = image_dimensions(image.image) if image else (None, None)
+    # A queryset update: no-op for a product being deleted, and no save signals
+    Product.objects.filter(pk=product_id).update(
+        primary_image=image,
+        primary_image_path=image.image.name if image else '',
+        primary_image_alt_text=image.alt_text if image else '',
+        primary_image_width=width,
+        primary_image_height=height,
+        primary_image_created_at=image.created_at if image else None,
+        updated_at=timezone.now(),
+    )
 
 class ProductAttribute(models.Model):
     """For product specifications like Color, Size, Weight etc."""
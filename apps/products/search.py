@@ -0,0 +1,329 @@
+# In-memory inverted index with BM25 ranking over Product.search_document
+import bisect
+import itertools
+import math
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Product
+from .text import edit_distance, name_key, tokenize, trigrams
+
+
+class TrigramIndex:
+    """
+    Character trigram -> word postings over the words of product and brand
+    names, used to find the intended word behind a misspelled one. A lookup
+    only reads the postings of the word's own trigrams, so it stays
+    independent of catalog size.
+    """
+
+    def __init__(self, words):
+        self.words = sorted(set(words))
+        postings = {}
+        sizes = []
+        for word_id, word in enumerate(self.words):
+            grams = trigrams(word)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(word_id)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self.sizes = np.array(sizes, dtype=np.float32)
+
+    def candidates(self, word, limit=5, shortlist=20, min_similarity=0.3):
+        """
+        Known words close to ``word``: shortlisted by trigram overlap (Dice
+        coefficient), then ordered by edit distance, allowing about one
+        edit per four characters
+        """
+        grams = trigrams(word)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+        ids, overlap = np.unique(np.concatenate(lists), return_counts=True)
+        similarity = 2 * overlap / (len(grams) + self.sizes[ids])
+        keep = similarity >= min_similarity
+        ids, similarity = ids[keep], similarity[keep]
+        top = np.argsort(-similarity, kind='stable')[:shortlist]
+
+        max_edits = max(1, len(word) // 4)
+        ranked = []
+        for position in top:
+            candidate = self.words[ids[position]]
+            distance = edit_distance(word, candidate, max_edits)
+            if distance <= max_edits:
+                ranked.append((distance, -similarity[position], candidate))
+        ranked.sort()
+        return [candidate for _, _, candidate in ranked[:limit]]
+
+
+class BM25Index:
+    """
+    Term -> postings map over product search documents.
+
+    Each posting stores its precomputed BM25 impact, so a query only sums
+    impacts over the postings of its terms and never touches documents
+    that share no term with it.
+    """
+
+    def __init__(self, product_ids, documents, names=(), brands=(), k1=1.2, b=0.75):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        # (name_key, id) pairs in order, so name-prefix matches are a bisected range
+        self.sorted_names = sorted(zip(names, product_ids))
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        entries = {}
+        for slot, document in enumerate(documents):
+            terms = document.split()
+            lengths[slot] = len(terms)
+            for term, tf in Counter(terms).items():
+                entries.setdefault(term, ([], []))
+                entries[term][0].append(slot)
+                entries[term][1].append(tf)
+
+        average = float(lengths.mean()) if len(lengths) else 0.0
+        norms = k1 * (1 - b + b * lengths / average) if average else np.full(len(lengths), k1, dtype=np.float32)
+        size = len(documents)
+
+        self.postings = {}
+        for term, (slots, tfs) in entries.items():
+            slots = np.array(slots, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = math.log(1 + (size - len(slots) + 0.5) / (len(slots) + 0.5))
+            impacts = (idf * tfs * (k1 + 1) / (tfs + norms[slots])).astype(np.float32)
+            self.postings[term] = (slots, impacts)
+        self.vocabulary = sorted(self.postings)
+        # Typo correction only proposes words from names and brands
+        self.trigrams = TrigramIndex(word for name in {*names, *brands} for word in name.split())
+
+    @classmethod
+    def from_database(cls):
+        rows = (
+            Product.objects.filter(is_active=True)
+            .values_list('id', 'search_document', 'name_key', 'brand__name')
+            .iterator(chunk_size=5000)
+        )
+        product_ids = []
+        documents = []
+        names = []
+        brands = set()
+        for product_id, document, name, brand in rows:
+            product_ids.append(product_id)
+            documents.append(document)
+            names.append(name)
+            brands.add(name_key(brand or ''))
+        return cls(product_ids, documents, names, brands)
+
+    def __len__(self):
+        return self.product_ids.shape[0]
+
+    def expand(self, prefix, limit):
+        """Vocabulary terms starting with ``prefix``, most frequent first"""
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        stop = bisect.bisect_left(self.vocabulary, prefix + '\uffff', start)
+        terms = self.vocabulary[start:stop]
+        if len(terms) > limit:
+            terms = sorted(terms, key=lambda term: -self.postings[term][0].shape[0])[:limit]
+        return terms
+
+    def match(self, terms):
+        """(slots, scores) of documents containing any of ``terms``, best impact per document"""
+        postings = [self.postings[term] for term in terms if term in self.postings]
+        if not postings:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        if len(postings) == 1:
+            return postings[0]
+        slots = np.concatenate([slots for slots, _ in postings])
+        impacts = np.concatenate([impacts for _, impacts in postings])
+        unique, inverse = np.unique(slots, return_inverse=True)
+        scores = np.full(unique.shape[0], -np.inf, dtype=np.float32)
+        np.maximum.at(scores, inverse, impacts)
+        return unique, scores
+
+    def search(self, query, prefix_expansions=50):
+        """
+        Product ids of documents containing every query word, best BM25
+        score first. The last word also matches longer terms it is a prefix
+        of, so results make sense while the user is still typing.
+        """
+        words = tokenize(query)
+        if not words or not len(self):
+            return np.empty(0, dtype=np.int64)
+        groups = [[word] for word in words[:-1]]
+        last = words[-1]
+        groups.append([last] + [term for term in self.expand(last, prefix_expansions) if term != last])
+
+        # Intersect from the rarest group so the candidate set only shrinks
+        matches = sorted((self.match(terms) for terms in groups), key=lambda match: match[0].shape[0])
+        slots, scores = matches[0]
+        for other_slots, other_scores in matches[1:]:
+            if not slots.shape[0]:
+                break
+            slots, left, right = np.intersect1d(slots, other_slots, assume_unique=True, return_indices=True)
+            scores = scores[left] + other_scores[right]
+
+        order = np.lexsort((slots, -scores))
+        return self.product_ids[slots[order]]
+
+    def correct(self, query):
+        """
+        ``query`` with unknown words replaced by their closest name or
+        brand word, or None when nothing needed (or allowed) correcting
+        """
+        words = tokenize(query)
+        corrected = []
+        for position, word in enumerate(words):
+            known = word in self.postings
+            if not known and position == len(words) - 1:
+                # A word still being typed is fine if it starts a known term
+                known = bool(self.expand(word, 1))
+            if known:
+                corrected.append(word)
+                continue
+            candidates = self.trigrams.candidates(word)
+            if not candidates:
+                return None
+            corrected.append(candidates[0])
+        return ' '.join(corrected) if corrected != words else None
+
+
+class PrefixRankedResults:
+    """
+    Search matches ordered with names starting with the whole query first,
+    then names starting with its first word, then everything else by BM25.
+
+    Prefix tiers are read from the index's ``(name_key, id)``-sorted array:
+    each starts at a bisect and is walked only as far as the requested
+    slice needs, so a page never ranks the whole match set. Supports
+    ``len()`` and slicing, which is all the paginators use.
+    """
+
+    def __init__(self, query, product_ids, corrected_query=None, sorted_names=()):
+        self.product_ids = product_ids
+        self.corrected_query = corrected_query
+        self.sorted_names = sorted_names
+        self.matched = set(product_ids)
+        words = tokenize(query)
+        self.prefixes = list(dict.fromkeys([name_key(query), words[0]])) if words else []
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def _prefix_matches(self, prefix):
+        for position in range(bisect.bisect_left(self.sorted_names, (prefix,)), len(self.sorted_names)):
+            name, product_id = self.sorted_names[position]
+            if not name.startswith(prefix):
+                return
+            # Only rows the full-text match accepted (every query word present)
+            if product_id in self.matched:
+                yield product_id
+
+    def _ranked(self):
+        seen = set()
+        for prefix in self.prefixes:
+            for product_id in self._prefix_matches(prefix):
+                if product_id not in seen:
+                    seen.add(product_id)
+                    yield product_id
+        for product_id in self.product_ids:
+            if product_id not in seen:
+                yield product_id
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, _ = item.indices(len(self))
+            return list(itertools.islice(self._ranked(), start, stop))
+        return self[item:item + 1][0]
+
+
+def catalog_signature():
+    """Cheap summary of the active catalog that changes whenever a product is added, edited or removed"""
+    summary = Product.objects.filter(is_active=True).aggregate(count=Count('id'), updated=Max('updated_at'))
+    return summary['count'], summary['updated']
+
+
+_index = None
+_stale = True
+_signature = None
+_checked_at = 0.0
+_build_lock = threading.Lock()
+
+
+def get_search_index():
+    """
+    Process-wide BM25 index, rebuilt after local product changes (via
+    signals) or when the catalog signature shows another process changed it.
+    One thread rebuilds outside any lock readers take; the others keep
+    searching the previous index until the new one is swapped in, and only
+    wait when there is no index yet.
+    """
+    global _index, _stale, _signature, _checked_at
+    index = _index
+    interval = getattr(settings, 'PRODUCT_SEARCH_CHECK_INTERVAL', 30)
+    if index is not None and not _stale and time.monotonic() - _checked_at < interval:
+        return index
+    if not _build_lock.acquire(blocking=index is None):
+        return index
+    try:
+        now = time.monotonic()
+        if _index is not None and not _stale and now - _checked_at < interval:
+            # Built by the thread this one waited for
+            return _index
+        signature = catalog_signature()
+        if _index is None or _stale or signature != _signature:
+            # Cleared first, so a change made during the build marks it stale again
+            _stale = False
+            _index = BM25Index.from_database()
+            _signature = signature
+        _checked_at = now
+        return _index
+    finally:
+        _build_lock.release()
+
+
+def reset_search_index():
+    """Mark the loaded index stale so the next search rebuilds it"""
+    global _stale
+    _stale = True
+
+
+def search_products(query):
+    """
+    Ids of active products matching ``query``, name-prefix matches first.
+    When fewer than PRODUCT_SEARCH_FUZZY_MIN_RESULTS match, misspelled words
+    are corrected and the corrected query's matches follow.
+    """
+    index = get_search_index()
+    limit = getattr(settings, 'PRODUCT_SEARCH_PREFIX_EXPANSIONS', 50)
+    product_ids = index.search(query, prefix_expansions=limit).tolist()
+
+    corrected_query = None
+    if len(product_ids) < getattr(settings, 'PRODUCT_SEARCH_FUZZY_MIN_RESULTS', 3):
+        corrected_query = index.correct(query)
+        if corrected_query:
+            found = set(product_ids)
+            product_ids += [
+                product_id for product_id in index.search(corrected_query, prefix_expansions=limit).tolist()
+                if product_id not in found
+            ]
+    return PrefixRankedResults(query, product_ids, corrected_query, index.sorted_names)
+
+
+def refresh_search_documents(queryset):
+    """Recompute stored search documents, e.g. after a category or brand rename or a bulk update"""
+    now = timezone.now()
+    products = list(queryset.select_related('category', 'brand').only(
+        'id', 'name', 'short_description', 'description', 'sku', 'category__name', 'brand__name',
+    ))
+    for product in products:
+        product.search_document = product.build_search_document()
+        product.name_key = name_key(product.name)
+        # bulk_update skips auto_now, but the catalog signature relies on it
+        product.updated_at = now
+    Product.objects.bulk_update(products, ['search_document', 'name_key', 'updated_at'], batch_size=500)
+    reset_search_index()
+    return len(products)
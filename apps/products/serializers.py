@@ -1,4 +1,12 @@
-from rest_framework import serializers
+from operator import itemgetter
+
+from django.core.signals import setting_changed
+from django.db.models import QuerySet
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from utils.fieldsets import SparseFieldsetSerializerMixin
 from .models import Product, Brand, ProductImage, ProductAttribute, ProductReview
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -30,7 +38,7 @@ class ProductReviewSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'updated_at']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     brand_name = serializers.CharField(source='brand.name', read_only=True)
     primary_image = serializers.SerializerMethodField()
@@ -54,11 +62,38 @@ class ProductSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
+    # What a listing card shows: name, price, image and rating
+    projections = {
+        'card': (
+            'id', 'name', 'slug', 'price', 'original_price', 'image', 'discount_percentage',
+            'stock_status', 'is_on_sale', 'rating_average', 'rating_count', 'primary_image',
+        ),
+    }
+    field_columns = {
+        'discount_amount': ('price', 'original_price'),
+        'is_on_sale': ('price', 'original_price'),
+        'category_name': ('category__name',),
+        'brand_name': ('brand__name',),
+        'primary_image': (
+            'primary_image', 'primary_image_path', 'primary_image_alt_text',
+            'primary_image_width', 'primary_image_height', 'primary_image_created_at',
+        ),
+    }
+
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
-        if primary_image:
-            return ProductImageSerializer(primary_image).data
-        return None
+        # Denormalized onto the product row, see sync_primary_image: the
+        # ProductImageSerializer fields plus the stored width and height
+        if not obj.primary_image_id:
+            return None
+        return {
+            'id': obj.primary_image_id,
+            'image': obj.primary_image_url,
+            'alt_text': obj.primary_image_alt_text,
+            'is_primary': True,
+            'created_at': serializers.DateTimeField().to_representation(obj.primary_image_created_at),
+            'width': obj.primary_image_width,
+            'height': obj.primary_image_height,
+        }
 
     def get_discount_amount(self, obj):
         try:
@@ -75,6 +110,172 @@ class ProductSerializer(serializers.ModelSerializer):
         except:
             return False
 
+class ProductRowSerializer:
+    """
+    Read-only equivalent of ``ProductSerializer(many=True)`` over
+    ``.values(*ProductRowSerializer.columns)`` rows: no model instances and
+    no per-field dispatch, with decimals and datetimes still formatted by
+    ProductSerializer's own fields. Output is identical (see tests).
+    ``fields`` renders a sparse fieldset from ``.values(*columns_for(fields))``.
+    """
+    columns = (
+        'id', 'name', 'slug', 'description', 'short_description',
+        'price', 'original_price', 'image', 'discount_percentage',
+        'category_id', 'category__name', 'brand_id', 'brand__name',
+        'stock', 'stock_status', 'sku', 'is_active', 'is_featured', 'is_trending',
+        'view_count', 'rating_average', 'rating_count',
+        'primary_image_id', 'primary_image_path', 'primary_image_alt_text',
+        'primary_image_width', 'primary_image_height', 'primary_image_created_at',
+        'created_at', 'updated_at',
+    )
+    # Row columns of the fields that are not a column of the same name
+    field_columns = {
+        'discount_amount': ('price', 'original_price'),
+        'is_on_sale': ('price', 'original_price'),
+        'category': ('category_id',),
+        'category_name': ('category__name',),
+        'brand': ('brand_id',),
+        'brand_name': ('brand_id', 'brand__name'),
+        'primary_image': (
+            'primary_image_id', 'primary_image_path', 'primary_image_alt_text',
+            'primary_image_width', 'primary_image_height', 'primary_image_created_at',
+        ),
+    }
+
+    # Formatting fields of ProductSerializer; reset when settings change
+    _fields = None
+
+    def __init__(self, rows, context=None, fields=None):
+        if isinstance(rows, QuerySet):
+            rows = rows.values(*self.columns_for(fields))
+        self.rows = rows
+        self.context = context or {}
+        self.fields = fields
+
+    @classmethod
+    def columns_for(cls, fields):
+        """``.values()`` columns rendering ``fields`` reads; all of them for None"""
+        if fields is None:
+            return cls.columns
+        columns = ['id']
+        for name in fields:
+            columns.extend(cls.field_columns.get(name, (name,)))
+        return tuple(dict.fromkeys(columns))
+
+    @classmethod
+    def get_fields(cls):
+        if cls._fields is None:
+            cls._fields = ProductSerializer().fields
+        return cls._fields
+
+    @staticmethod
+    def memoized(column, to_representation):
+        """Decimal formatting of a row column per distinct value: pages repeat prices and ratings"""
+        formatted = {}
+
+        def represent(row):
+            value = row[column]
+            if value is None:
+                return None
+            if value not in formatted:
+                formatted[value] = to_representation(value)
+            return formatted[value]
+        return represent
+
+    @staticmethod
+    def datetime_formatter(column, field):
+        """DateTimeField.to_representation of a row column, with the output timezone looked up once per page"""
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return lambda row: field.to_representation(row[column])
+
+        def represent(row):
+            value = row[column]
+            if not value or not timezone.is_aware(value):
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return represent
+
+    def getters(self):
+        """Row -> value function of every ProductSerializer field"""
+        fields = self.get_fields()
+        image_field = fields['image']
+        request = self.context.get('request')
+        image_storage = Product._meta.get_field('image').storage
+        primary_storage = ProductImage._meta.get_field('image').storage
+        image_created_at = self.datetime_formatter('primary_image_created_at', serializers.DateTimeField())
+
+        def image_url(row):
+            name = row['image']
+            if not name:
+                return None
+            if not getattr(image_field, 'use_url', True):
+                return name
+            url = image_storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+
+        def discount_amount(row):
+            if row['original_price'] and row['price']:
+                return float(row['original_price'] - row['price'])
+            return 0.0
+
+        def primary_image(row):
+            if not row['primary_image_id']:
+                return None
+            path = row['primary_image_path']
+            return {
+                'id': row['primary_image_id'],
+                'image': primary_storage.url(path) if path else None,
+                'alt_text': row['primary_image_alt_text'],
+                'is_primary': True,
+                'created_at': image_created_at(row),
+                'width': row['primary_image_width'],
+                'height': row['primary_image_height'],
+            }
+
+        getters = {name: itemgetter(name) for name in ProductSerializer.Meta.fields}
+        getters.update({
+            'image': image_url,
+            'discount_amount': discount_amount,
+            'category': itemgetter('category_id'),
+            'category_name': itemgetter('category__name'),
+            'brand': itemgetter('brand_id'),
+            'brand_name': itemgetter('brand__name'),
+            'is_on_sale': lambda row: row['original_price'] is not None and row['price'] < row['original_price'],
+            'primary_image': primary_image,
+        })
+        for name in ('price', 'original_price', 'discount_percentage', 'rating_average'):
+            getters[name] = self.memoized(name, fields[name].to_representation)
+        for name in ('created_at', 'updated_at'):
+            getters[name] = self.datetime_formatter(name, fields[name])
+        return getters
+
+    @property
+    def data(self):
+        names = ProductSerializer.Meta.fields if self.fields is None else self.fields
+        getters = self.getters()
+        getters = [(name, getters[name]) for name in names]
+        # ProductSerializer skips brand_name when there is no brand
+        brand_name = 'brand_name' in names
+
+        data = []
+        for row in self.rows:
+            item = {name: get(row) for name, get in getters}
+            if brand_name and row['brand_id'] is None:
+                del item['brand_name']
+            data.append(item)
+        return data
+
+
+@receiver(setting_changed)
+def reset_row_fields(**kwargs):
+    ProductRowSerializer._fields = None
+
+
 class ProductDetailSerializer(ProductSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     attributes = ProductAttributeSerializer(many=True, read_only=True)
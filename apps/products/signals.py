@@ -0,0 +1,96 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.categories.models import Category
+from utils.cache import bump_generation
+from .models import Brand, Product, ProductAttribute, ProductImage, ProductReview, sync_primary_image
+from .catalog import reset_catalog_index
+from .search import refresh_search_documents, reset_search_index
+from .suggest import (
+    BRAND, CATEGORY, PRODUCT, remove_suggestion, update_product_suggestion, update_suggestion,
+)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_search_index(sender, update_fields=None, **kwargs):
+    # Counter and rating saves leave the indexed documents untouched
+    if update_fields and not {'search_document', 'is_active'}.intersection(update_fields):
+        return
+    reset_search_index()
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_documents(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_documents(Product.objects.filter(category=instance))
+
+
+@receiver(post_save, sender=Brand)
+def refresh_brand_documents(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_documents(Product.objects.filter(brand=instance))
+
+
+@receiver(post_save, sender=Product)
+def update_product_suggestions(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not {'name', 'slug', 'is_active'}.intersection(update_fields):
+        return
+    update_product_suggestion(instance)
+
+
+@receiver(post_save, sender=Brand)
+def update_brand_suggestions(sender, instance, **kwargs):
+    update_suggestion(BRAND, instance)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, **kwargs):
+    update_suggestion(CATEGORY, instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def remove_suggestions(sender, instance, **kwargs):
+    kind = {Product: PRODUCT, Brand: BRAND, Category: CATEGORY}[sender]
+    remove_suggestion(kind, instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def invalidate_catalog_index(sender, update_fields=None, **kwargs):
+    # Counters are neither filtered nor sorted on
+    if update_fields and set(update_fields) <= {'view_count', 'purchase_count'}:
+        return
+    reset_catalog_index()
+
+
+@receiver(post_delete, sender=ProductImage)
+def clear_primary_image(sender, instance, **kwargs):
+    sync_primary_image(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_response_generation(sender, update_fields=None, **kwargs):
+    # View and purchase counters are refreshed when the cached response expires
+    if update_fields and set(update_fields) <= {'view_count', 'purchase_count'}:
+        return
+    entity = {
+        Product: 'product', ProductImage: 'product', ProductAttribute: 'product', ProductReview: 'product',
+        Brand: 'brand', Category: 'category',
+    }[sender]
+    bump_generation(entity)
@@ -0,0 +1,249 @@
+# In-memory prefix index for search-box suggestions
+import bisect
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from apps.categories.models import Category
+from .models import Brand, Product
+from .text import name_key
+
+PRODUCT = 'product'
+BRAND = 'brand'
+CATEGORY = 'category'
+
+# A purchase says more about demand than a view
+PURCHASE_WEIGHT = 5
+
+# Names are also suggested from the start of their first few words
+MAX_WORD_STARTS = 4
+
+# Prefixes this short match much of the catalog, so they get their own
+# weight-ordered buckets instead of a scan of the matching range
+SHORT_PREFIX_LENGTH = 3
+
+
+def product_weight(view_count, purchase_count):
+    return 1 + (view_count or 0) + PURCHASE_WEIGHT * (purchase_count or 0)
+
+
+def word_starts(key):
+    """``key`` and its suffixes starting at each of the next few words"""
+    keys = [key]
+    position = 0
+    for _ in range(MAX_WORD_STARTS - 1):
+        position = key.find(' ', position) + 1
+        if not position:
+            break
+        keys.append(key[position:])
+    return keys
+
+
+class SuggestionIndex:
+    """
+    Sorted array of ``(key, kind, id)`` entries, one per word start of every
+    product, brand and category name, so the suggestions for a prefix are a
+    bisected slice. Prefixes of up to SHORT_PREFIX_LENGTH characters, which
+    would slice most of the array, read the head of a bucket kept in
+    ranking order instead. Entities are inserted and removed one at a time
+    as the catalog changes.
+    """
+
+    def __init__(self):
+        self.entries = []
+        # Short prefix -> sorted [(rank key, kind, id)]
+        self.buckets = {}
+        # (kind, id) -> (name, slug, weight, keys)
+        self.items = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls):
+        index = cls()
+        weights = {BRAND: {}, CATEGORY: {}}
+        products = Product.objects.filter(is_active=True).values_list(
+            'id', 'name', 'slug', 'brand_id', 'category_id', 'view_count', 'purchase_count',
+        )
+        for product_id, name, slug, brand_id, category_id, views, purchases in products.iterator(chunk_size=5000):
+            weight = product_weight(views, purchases)
+            index._add(PRODUCT, product_id, name, slug, weight)
+            # Brands and categories rank by the demand of their products
+            weights[BRAND][brand_id] = weights[BRAND].get(brand_id, 0) + weight
+            weights[CATEGORY][category_id] = weights[CATEGORY].get(category_id, 0) + weight
+        for kind, model in ((BRAND, Brand), (CATEGORY, Category)):
+            for pk, name, slug in model.objects.filter(is_active=True).values_list('id', 'name', 'slug'):
+                index._add(kind, pk, name, slug, weights[kind].get(pk, 1))
+        index.entries.sort()
+        for bucket in index.buckets.values():
+            bucket.sort()
+        return index
+
+    def __len__(self):
+        return len(self.items)
+
+    @staticmethod
+    def _rank(name, weight):
+        """Heaviest first, then shorter names"""
+        return (-weight, len(name), name)
+
+    def _item_rank(self, match):
+        name, _, weight, _ = self.items[match]
+        return self._rank(name, weight)
+
+    @staticmethod
+    def _short_prefixes(keys):
+        return {key[:length] for key in keys for length in range(1, SHORT_PREFIX_LENGTH + 1) if len(key) >= length}
+
+    def _add(self, kind, pk, name, slug, weight, keep_sorted=False):
+        keys = word_starts(name_key(name))
+        self.items[(kind, pk)] = (name, slug, weight, keys)
+        insert = bisect.insort if keep_sorted else list.append
+        for key in keys:
+            insert(self.entries, (key, kind, pk))
+        for prefix in self._short_prefixes(keys):
+            insert(self.buckets.setdefault(prefix, []), (self._rank(name, weight), kind, pk))
+
+    @staticmethod
+    def _discard(entries, entry):
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    def _remove(self, kind, pk):
+        item = self.items.pop((kind, pk), None)
+        if item is None:
+            return None
+        name, _, weight, keys = item
+        for key in keys:
+            self._discard(self.entries, (key, kind, pk))
+        for prefix in self._short_prefixes(keys):
+            self._discard(self.buckets[prefix], (self._rank(name, weight), kind, pk))
+        return item
+
+    def update(self, kind, pk, name, slug, weight=None):
+        """Insert or replace one entity; ``weight=None`` keeps its current weight"""
+        with self._lock:
+            old = self._remove(kind, pk)
+            if weight is None:
+                weight = old[2] if old else 1
+            self._add(kind, pk, name, slug, weight, keep_sorted=True)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._remove(kind, pk)
+
+    def suggest(self, query, limit=8):
+        """Heaviest entities whose name (or one of its first words) starts with ``query``"""
+        prefix = name_key(query)
+        if not prefix:
+            return []
+        with self._lock:
+            if len(prefix) <= SHORT_PREFIX_LENGTH:
+                best = [(kind, pk) for _, kind, pk in self.buckets.get(prefix, [])[:limit]]
+            else:
+                start = bisect.bisect_left(self.entries, (prefix,))
+                stop = bisect.bisect_left(self.entries, (prefix + '\uffff',), start)
+                # One entity may match at several word starts
+                matches = {(kind, pk) for _, kind, pk in self.entries[start:stop]}
+                best = heapq.nsmallest(limit, matches, key=self._item_rank)
+            return [
+                {'id': pk, 'name': self.items[(kind, pk)][0], 'slug': self.items[(kind, pk)][1], 'type': kind}
+                for kind, pk in best
+            ]
+
+
+_index = None
+_built_at = 0.0
+_rebuilding = False
+# Changes made while an index is being built, replayed onto it before the swap
+_pending = None
+_index_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+def _build():
+    """Build a new index and swap it in with the changes made meanwhile applied"""
+    global _index, _built_at, _pending
+    with _index_lock:
+        _pending = []
+    try:
+        index = SuggestionIndex.from_database()
+        with _index_lock:
+            for method, args in _pending:
+                getattr(index, method)(*args)
+            _index = index
+            _built_at = time.monotonic()
+    finally:
+        _pending = None
+
+
+def _rebuild():
+    global _rebuilding
+    try:
+        _build()
+    finally:
+        _rebuilding = False
+        connection.close()
+
+
+def get_suggestion_index():
+    """
+    Process-wide suggestion index. Built on first use; afterwards it is
+    rebuilt in a background thread every PRODUCT_SUGGEST_REFRESH seconds
+    (to pick up view and purchase counts and other processes' edits) while
+    requests keep reading the current one.
+    """
+    global _rebuilding
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                _build()
+        return _index
+    if time.monotonic() - _built_at >= getattr(settings, 'PRODUCT_SUGGEST_REFRESH', 600):
+        with _index_lock:
+            start = not _rebuilding
+            _rebuilding = True
+        if start:
+            threading.Thread(target=_rebuild, daemon=True).start()
+    return _index
+
+
+def _apply(method, *args):
+    """Apply a change to the loaded index, and record it for an index being built"""
+    with _index_lock:
+        index = _index
+        if _pending is not None:
+            _pending.append((method, args))
+    if index is not None:
+        getattr(index, method)(*args)
+
+
+def update_product_suggestion(product):
+    """Keep the loaded index in step with one saved product (no-op before first use)"""
+    if not product.is_active:
+        _apply('remove', PRODUCT, product.pk)
+        return
+    # Counter saves may carry F() expressions rather than numbers
+    views, purchases = product.view_count, product.purchase_count
+    weight = product_weight(views, purchases) if isinstance(views, int) and isinstance(purchases, int) else None
+    _apply('update', PRODUCT, product.pk, product.name, product.slug, weight)
+
+
+def update_suggestion(kind, obj):
+    if obj.is_active:
+        _apply('update', kind, obj.pk, obj.name, obj.slug)
+    else:
+        _apply('remove', kind, obj.pk)
+
+
+def remove_suggestion(kind, pk):
+    _apply('remove', kind, pk)
+
+
+def expire_suggestion_index():
+    """Schedule a background rebuild, e.g. after bulk .update() calls that send no signals"""
+    global _built_at
+    _built_at = 0.0
@@ -1,3 +1,731 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+import uuid
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
\ No newline at end of file
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.paginator import EmptyPage
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.categories.models import Category
+from utils.cache import bump_generation
+from utils.pagination import EstimatedCountPaginator
+from utils.renderers import ORJSONRenderer
+from . import catalog, suggest
+from .catalog import reset_catalog_index
+from .facets import facet_cache, facet_counts
+from .models import Brand, Product, ProductImage, ProductView
+from .search import BM25Index, PrefixRankedResults, reset_search_index, search_products
+from .serializers import ProductImageSerializer, ProductRowSerializer, ProductSerializer
+from .suggest import BRAND, CATEGORY, PRODUCT, SuggestionIndex
+from .tracking import flush_product_views, record_product_view
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='product.png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProductRowSerializerParityTests(TestCase):
+    """ProductRowSerializer and the list views using it must render exactly what ProductSerializer renders"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        audio = Category.objects.create(name='Audio')
+        home = Category.objects.create(name='Home & Kitchen')
+        sony = Brand.objects.create(name='Sony')
+        cafe = Brand.objects.create(name='Café Crème')
+        cls.products = [
+            Product.objects.create(
+                name='Wireless Headphones', description='Noise cancelling', short_description='Over-ear',
+                price=Decimal('199.99'), original_price=Decimal('249.50'), category=audio, brand=sony,
+                sku='WH-1', stock=25, is_featured=True, rating_average=Decimal('4.35'), rating_count=12,
+            ),
+            Product.objects.create(
+                name='Espresso Machine', description='Ünïcödé “quotes” & <tags>', price=Decimal('89'),
+                category=home, brand=cafe, sku='EM-1', stock=3, is_trending=True,
+            ),
+            Product.objects.create(
+                name='Unbranded Cable', description='', price=Decimal('0.50'), original_price=Decimal('0.25'),
+                category=audio, sku='UC-1', stock=0, view_count=7,
+            ),
+            Product.objects.create(
+                name='Kettle', description='Boils water', price=Decimal('35.10'), original_price=Decimal('35.10'),
+                category=home, brand=sony, sku='KT-1', stock=11, is_active=False,
+            ),
+        ]
+        headphones = cls.products[0]
+        headphones.image = png(40, 30)
+        headphones.save()
+        ProductImage.objects.create(product=headphones, image=png(1200, 900), alt_text='Front', is_primary=True)
+        ProductImage.objects.create(product=headphones, image=png(20, 20), alt_text='Side', is_primary=False)
+        ProductImage.objects.create(product=cls.products[1], image=png(64, 48), is_primary=False)
+
+    def setUp(self):
+        reset_catalog_index()
+        self.addCleanup(reset_catalog_index)
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def expected(self, ids, request=None):
+        products = Product.objects.select_related('category', 'brand').in_bulk(ids)
+        context = {'request': request} if request is not None else {}
+        return self.render(ProductSerializer([products[pk] for pk in ids], many=True, context=context).data)
+
+    def test_rows_match_product_serializer(self):
+        queryset = Product.objects.order_by('id')
+        ids = list(queryset.values_list('id', flat=True))
+        request = Request(APIRequestFactory().get('/api/products/'))
+        for context in ({}, {'request': request}):
+            with self.subTest(request='request' in context):
+                rows = ProductRowSerializer(queryset, context=context).data
+                self.assertEqual(self.render(rows), self.expected(ids, context.get('request')))
+
+    def test_rows_from_values_list(self):
+        rows = list(Product.objects.order_by('-price').values(*ProductRowSerializer.columns))
+        self.assertEqual(
+            self.render(ProductRowSerializer(rows).data),
+            self.expected([row['id'] for row in rows]),
+        )
+
+    def test_denormalized_primary_image(self):
+        item = ProductRowSerializer(Product.objects.filter(pk=self.products[0].pk)).data[0]
+        self.assertEqual(item['primary_image']['alt_text'], 'Front')
+        self.assertEqual((item['primary_image']['width'], item['primary_image']['height']), (800, 600))
+        front = ProductImage.objects.get(alt_text='Front')
+        self.assertEqual(item['primary_image']['created_at'], ProductImageSerializer(front).data['created_at'])
+        item = ProductRowSerializer(Product.objects.filter(pk=self.products[1].pk)).data[0]
+        self.assertIsNone(item['primary_image'])
+
+    def assertListMatches(self, url, params):
+        # Each path must render the page itself rather than read the response cache
+        cache.clear()
+        response = APIClient().get(url, params)
+        self.assertEqual(response.status_code, 200)
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(self.render(response.data['results']), self.expected(ids, response.wsgi_request))
+        return ids
+
+    def test_list_views_match_product_serializer(self):
+        cases = [
+            ('/api/products/', {}),
+            ('/api/products/', {'sort_by': 'price', 'page_size': 2}),
+            ('/api/products/', {'brand': self.products[0].brand_id, 'sort_by': '-name'}),
+            ('/api/products/', {'cursor': '', 'sort_by': 'rating_average'}),
+        ]
+        for url, params in cases:
+            for index_enabled in (True, False):
+                with self.subTest(url=url, params=params, index=index_enabled):
+                    if index_enabled:
+                        self.assertListMatches(url, params)
+                    else:
+                        with mock.patch.object(catalog, 'get_catalog_index', return_value=None):
+                            self.assertListMatches(url, params)
+
+    def test_filter_view_matches_product_serializer(self):
+        from .views import ProductFilterView
+
+        factory = APIRequestFactory()
+        for params in ({}, {'min_price': '1', 'sort_by': '-price'}, {'search': 'espresso'}, {'cursor': ''}):
+            with self.subTest(params=params):
+                cache.clear()
+                request = factory.get('/api/products/filter/', params)
+                response = ProductFilterView.as_view()(request)
+                self.assertEqual(response.status_code, 200)
+                ids = [item['id'] for item in response.data['results']]
+                self.assertTrue(ids)
+                self.assertEqual(
+                    self.render(response.data['results']),
+                    self.expected(ids, Request(factory.get('/api/products/filter/', params))),
+                )
+
+    def test_sparse_fieldsets_match_product_serializer(self):
+        cases = [
+            ({'projection': 'card'}, ProductSerializer.projections['card']),
+            ({'fields': 'name,category_name,id'}, ('id', 'name', 'category_name')),
+            ({'projection': 'card', 'omit': 'primary_image,slug'}, None),
+            ({'fields': 'name', 'sort_by': 'price', 'cursor': ''}, ('name',)),
+        ]
+        for params, fields in cases:
+            with self.subTest(params=params):
+                cache.clear()
+                response = APIClient().get('/api/products/', params)
+                self.assertEqual(response.status_code, 200)
+                results = response.data['results']
+                if fields is not None:
+                    self.assertEqual(tuple(results[0]), fields)
+                if 'id' not in results[0]:
+                    continue
+                ids = [item['id'] for item in results]
+                products = Product.objects.select_related('category', 'brand').in_bulk(ids)
+                expected = ProductSerializer(
+                    [products[pk] for pk in ids], many=True, fields=tuple(results[0]),
+                    context={'request': response.wsgi_request},
+                ).data
+                self.assertEqual(self.render(results), self.render(expected))
+
+        response = APIClient().get('/api/products/', {'fields': 'name,colour'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_name_sort_matches_database_order(self):
+        Product.objects.create(
+            name='éclair Tin', description='', price=Decimal('4'), category=self.products[0].category,
+            sku='ET-1', stock=2,
+        )
+        expected = list(
+            Product.objects.filter(is_active=True).order_by('name_key', 'id').values_list('id', flat=True)
+        )
+        client = APIClient()
+        for sort_by in ('name', '-name'):
+            order = expected if sort_by == 'name' else expected[::-1]
+            with self.subTest(sort_by=sort_by):
+                cache.clear()
+                reset_catalog_index()
+                response = client.get('/api/products/', {'sort_by': sort_by})
+                self.assertEqual([item['id'] for item in response.data['results']], order)
+                with mock.patch.object(catalog, 'get_catalog_index', return_value=None):
+                    cache.clear()
+                    response = client.get('/api/products/', {'sort_by': sort_by})
+                self.assertEqual([item['id'] for item in response.data['results']], order)
+
+                ids = []
+                response = client.get('/api/products/', {'sort_by': sort_by, 'cursor': '', 'page_size': 2})
+                while True:
+                    ids += [item['id'] for item in response.data['results']]
+                    if not response.data['next']:
+                        break
+                    response = client.get(response.data['next'])
+                self.assertEqual(ids, order)
+
+    def test_index_follows_other_processes_writes(self):
+        index = catalog.get_catalog_index()
+        self.assertIs(catalog.get_catalog_index(), index)
+        # As another worker would: a signal-less write, seen here only through the shared generation
+        Product.objects.filter(pk=self.products[2].pk).update(rating_average=Decimal('5'))
+        bump_generation('product')
+        response = APIClient().get('/api/products/', {'sort_by': '-rating_average'})
+        self.assertIsNot(catalog.get_catalog_index(), index)
+        self.assertEqual(response.data['results'][0]['id'], self.products[2].pk)
+
+    def test_cursor_pages_over_rows(self):
+        client = APIClient()
+        response = client.get('/api/products/', {'cursor': '', 'page_size': 2, 'sort_by': 'price'})
+        first = [item['id'] for item in response.data['results']]
+        response = client.get(response.data['next'])
+        second = [item['id'] for item in response.data['results']]
+        expected = list(Product.objects.filter(is_active=True).order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(first + second, expected)
+        self.assertIsNone(response.data['next'])
+
+
+@override_settings(PRODUCT_VIEW_FLUSH_INTERVAL=0)
+class ConditionalGetTests(TestCase):
+    """ETag / Last-Modified validators follow generation bumps and the counters they do not cover"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Audio')
+        cls.product = Product.objects.create(
+            name='Speaker', description='Loud', price=Decimal('50'), category=category, sku='SP-1', stock=5,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(REMOTE_ADDR='10.0.0.1')
+        self.url = f'/api/products/{self.product.pk}/'
+
+    def test_matching_etag_is_not_modified_until_a_write(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.product.name = 'Bookshelf Speaker'
+        self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['name'], 'Bookshelf Speaker')
+
+    def test_view_count_changes_are_revalidated_each_window(self):
+        # view_count moves through signal-less updates that bump no generation
+        now = 1_000_000_000.0
+        with mock.patch('utils.cache.time.time', return_value=now):
+            response = self.client.get(self.url)
+            etag, last_modified, views = response['ETag'], response['Last-Modified'], response.data['view_count']
+            for _ in range(3):
+                self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).view_count, views + 4)
+
+        with mock.patch('utils.cache.time.time', return_value=now + settings.RESPONSE_CACHE_TIMEOUT):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['view_count'], views + 4)
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PRODUCT_VIEW_FLUSH_INTERVAL=3600)
+class ProductViewTrackingTests(TestCase):
+    """Views are buffered during requests and written in one batch by the flush"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Audio')
+        cls.product = Product.objects.create(
+            name='Speaker', description='Loud', price=Decimal('50'), category=category, sku='SP-3', stock=5,
+        )
+        cls.deleted = Product.objects.create(
+            name='Radio', description='', price=Decimal('20'), category=category, sku='RA-3', stock=5,
+        )
+
+    def test_buffered_views_are_written_on_flush(self):
+        flush_product_views()
+        deleted_pk = self.deleted.pk
+        self.deleted.delete()
+        for ip_address, count_repeat in (('10.0.0.1', True), ('10.0.0.1', True), ('10.0.0.2', False),
+                                         ('10.0.0.2', False)):
+            record_product_view(self.product.pk, None, ip_address, count_repeat)
+        record_product_view(deleted_pk, None, '10.0.0.1')
+        self.assertFalse(ProductView.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).view_count, 0)
+
+        flush_product_views()
+        # Repeat visits count only where count_repeat is set; deleted products are skipped
+        self.assertEqual(Product.objects.get(pk=self.product.pk).view_count, 3)
+        self.assertEqual(
+            sorted(ProductView.objects.values_list('product_id', 'ip_address')),
+            [(self.product.pk, '10.0.0.1'), (self.product.pk, '10.0.0.2')],
+        )
+
+        # Known visitors are not stored twice; page views write nothing during the request
+        record_product_view(self.product.pk, None, '10.0.0.2')
+        self.assertEqual(APIClient(REMOTE_ADDR='10.0.0.3').get(f'/api/products/{self.product.pk}/').status_code, 200)
+        self.assertEqual(ProductView.objects.count(), 2)
+        flush_product_views()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).view_count, 5)
+        self.assertEqual(ProductView.objects.count(), 3)
+
+
+class ResponseCacheTests(TestCase):
+    """Cached list responses are served until a generation they depend on is bumped"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Audio')
+        cls.product = Product.objects.create(
+            name='Speaker', description='Loud', price=Decimal('50'), category=category, sku='SP-2', stock=5,
+            is_featured=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        reset_catalog_index()
+        self.addCleanup(reset_catalog_index)
+
+    def names(self):
+        from .views import FeaturedProductsView
+
+        # The slug route shadows /featured/, so call the view directly
+        response = FeaturedProductsView.as_view()(APIRequestFactory().get('/api/products/featured/'))
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['results']]
+
+    def test_generation_bump_misses_the_cache(self):
+        self.assertEqual(self.names(), ['Speaker'])
+        # Signal-less writes are not seen while the generation stands
+        Product.objects.filter(pk=self.product.pk).update(name='Tower Speaker')
+        self.assertEqual(self.names(), ['Speaker'])
+        bump_generation('category')
+        self.assertEqual(self.names(), ['Tower Speaker'])
+
+        self.product.refresh_from_db()
+        self.product.is_featured = False
+        self.product.save()
+        self.assertEqual(self.names(), [])
+
+    def test_new_generation_is_not_rendered_from_an_older_index(self):
+        from .views import ProductFilterView
+
+        def prices():
+            request = APIRequestFactory().get('/api/products/filter/', {'max_price': '60'})
+            return [item['price'] for item in ProductFilterView.as_view()(request).data['results']]
+
+        self.assertEqual(prices(), ['50.00'])
+        # Another worker's write reaches this one only through the shared generation
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('75'))
+        bump_generation('product')
+        self.assertEqual(prices(), [])
+
+
+class ProductSearchTests(TestCase):
+    """BM25 ranking of the in-memory search index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Cables')
+        cls.product = Product.objects.create(
+            name='USB Cable', description='Braided nylon', price=Decimal('9'), category=category, sku='UC-2', stock=5,
+        )
+
+    def setUp(self):
+        reset_search_index()
+        self.addCleanup(reset_search_index)
+
+    def test_bm25_ranks_frequent_terms_in_short_documents_first(self):
+        index = BM25Index([1, 2, 3, 4], [
+            'usb cable usb cable',
+            'usb cable braided nylon long black',
+            'hdmi cable',
+            'usb charger',
+        ])
+        self.assertEqual(index.search('cable').tolist(), [1, 3, 2])
+        # Every word must match; the last one may still be being typed
+        self.assertEqual(index.search('cable usb').tolist(), [1, 2])
+        self.assertEqual(index.search('usb ca').tolist(), [1, 2])
+        self.assertEqual(index.search('usb hdmi').tolist(), [])
+
+    def test_name_prefix_matches_rank_first(self):
+        names = {1: 'usb cable long', 2: 'usb hub', 3: 'braided usb cable', 4: 'usb cable', 5: 'cable', 6: 'usb cable'}
+        sorted_names = sorted((name, product_id) for product_id, name in names.items())
+        # 6 is not a match
+        results = PrefixRankedResults('USB cable', [5, 4, 3, 2, 1], sorted_names=sorted_names)
+        self.assertEqual(results[:], [4, 1, 2, 5, 3])
+        self.assertEqual(results[1:3], [1, 2])
+        self.assertEqual(len(results), 5)
+
+    def test_misspelled_words_fall_back_to_trigram_corrections(self):
+        response = APIClient().get('/api/products/search/', {'q': 'usb cabke'})
+        self.assertEqual(response.data['corrected_query'], 'usb cable')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.product.pk])
+
+        # Words being typed, exact matches and unrelated words are left alone
+        self.assertIsNone(search_products('usb cab').corrected_query)
+        self.assertIsNone(search_products('cable').corrected_query)
+        self.assertEqual(search_products('xylophone')[:], [])
+        self.assertIsNone(search_products('xylophone').corrected_query)
+
+    def test_prefix_tiers_are_read_only_as_far_as_the_page(self):
+        class ReadCounting(list):
+            reads = 0
+
+            def __getitem__(self, position):
+                ReadCounting.reads += 1
+                return super().__getitem__(position)
+
+        sorted_names = ReadCounting(sorted((f'usb cable {i:04}', i) for i in range(1, 5001)))
+        results = PrefixRankedResults('usb cable', list(range(5000, 0, -1)), sorted_names=sorted_names)
+        self.assertEqual(results[:3], [1, 2, 3])
+        self.assertLess(ReadCounting.reads, 30)
+
+    def test_index_follows_product_changes(self):
+        self.assertEqual(search_products('usb')[:], [self.product.pk])
+        self.product.name = 'Gramophone'
+        self.product.save()
+        self.assertEqual(search_products('gramophone')[:], [self.product.pk])
+        self.assertEqual(search_products('usb')[:], [])
+
+
+class FacetCountTests(TestCase):
+    """Each facet counts under every filter but its own, and cached counts follow the catalog generation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.audio = Category.objects.create(name='Audio')
+        cls.home = Category.objects.create(name='Home')
+        cls.sony = Brand.objects.create(name='Sony')
+        cls.cafe = Brand.objects.create(name='Cafe')
+        for name, category, brand, price, stock, rating, active in (
+            ('Speaker', cls.audio, cls.sony, '30', 20, '4.5', True),
+            ('Radio', cls.audio, cls.cafe, '80', 5, '3.2', True),
+            ('Toaster', cls.home, cls.sony, '10', 0, '0', True),
+            ('Kettle', cls.home, cls.sony, '20', 9, '5', False),
+        ):
+            Product.objects.create(
+                name=name, description='', price=Decimal(price), category=category, brand=brand,
+                sku=name.upper(), stock=stock, rating_average=Decimal(rating), is_active=active,
+            )
+
+    def setUp(self):
+        cache.clear()
+        facet_cache.clear()
+
+    def counts(self, facet, data, key='id'):
+        return {option[key]: option['count'] for option in data['facets'][facet]}
+
+    def test_counts_under_a_selected_facet(self):
+        data = facet_counts({'category': str(self.audio.pk)})
+        self.assertEqual(data['total'], 2)
+        # The selected facet keeps counting its other options
+        self.assertEqual(self.counts('category', data), {self.audio.pk: 2, self.home.pk: 1})
+        self.assertEqual(self.counts('brand', data), {self.sony.pk: 1, self.cafe.pk: 1})
+        self.assertEqual(
+            self.counts('stock_status', data, 'value'),
+            {'in_stock': 1, 'limited_stock': 1, 'out_of_stock': 0},
+        )
+        self.assertEqual([option['count'] for option in data['facets']['price'][:3]], [0, 1, 1])
+        self.assertEqual(self.counts('rating', data, 'min_rating'), {4: 1, 3: 2, 2: 2, 1: 2})
+
+        data = facet_counts({'category': str(self.audio.pk), 'brand': str(self.sony.pk)})
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(self.counts('category', data), {self.audio.pk: 1, self.home.pk: 1})
+        self.assertEqual(self.counts('brand', data), {self.sony.pk: 1, self.cafe.pk: 1})
+
+    def test_generation_bump_misses_the_cache(self):
+        hits, misses = facet_cache.hits, facet_cache.misses
+        self.assertEqual(facet_counts({})['total'], 3)
+        self.assertEqual(facet_counts({})['total'], 3)
+        self.assertEqual(facet_cache.hits - hits, 1)
+
+        # Writes without signals are only seen once something bumps the generation
+        Product.objects.filter(name='Kettle').update(is_active=True)
+        self.assertEqual(facet_counts({})['total'], 3)
+        bump_generation('product')
+        self.assertEqual(facet_counts({})['total'], 4)
+
+        Product.objects.get(name='Toaster').delete()
+        self.assertEqual(facet_counts({})['total'], 3)
+        self.assertEqual(facet_cache.misses - misses, 3)
+
+
+@override_settings(PAGINATION_EXACT_COUNT_THRESHOLD=5)
+class EstimatedCountPaginationTests(TestCase):
+    """Counts past the threshold come from the cache or an estimate, settled exactly on the last page"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Audio')
+        Product.objects.bulk_create(
+            Product(name=f'Speaker {i}', slug=f'speaker-{i}', description='', price=Decimal(10 + i),
+                    category=category, sku=f'SP-{i}', stock=i)
+            for i in range(12)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.queryset = Product.objects.order_by('id')
+
+    def test_small_results_are_counted_exactly(self):
+        paginator = EstimatedCountPaginator(self.queryset.filter(stock__lt=5), 2)
+        with mock.patch('utils.pagination.estimate_count') as estimate:
+            self.assertEqual(paginator.count, 5)
+        estimate.assert_not_called()
+        self.assertFalse(paginator.approximate)
+        self.assertEqual(paginator.num_pages, 3)
+
+    def test_large_results_reuse_the_cached_count(self):
+        paginator = EstimatedCountPaginator(self.queryset, 5)
+        # sqlite gives no estimate, so the first count is exact, and cached
+        self.assertEqual(paginator.count, 12)
+        self.assertFalse(paginator.approximate)
+        self.assertEqual(cache.get(paginator.count_cache_key()), 12)
+
+        Product.objects.filter(stock=0).delete()
+        paginator = EstimatedCountPaginator(self.queryset, 5)
+        with self.assertNumQueries(1):
+            # Only the bounded count runs
+            self.assertEqual(paginator.count, 12)
+        self.assertTrue(paginator.approximate)
+
+        with mock.patch('utils.pagination.estimate_count', return_value=3):
+            paginator = EstimatedCountPaginator(self.queryset.filter(stock__gte=1), 5)
+            # Never below what the bounded count has already seen
+            self.assertEqual(paginator.count, 6)
+        self.assertTrue(paginator.approximate)
+
+    def test_last_page_falls_back_to_the_exact_count(self):
+        cache.set(EstimatedCountPaginator(self.queryset, 5).count_cache_key(), 40)
+        paginator = EstimatedCountPaginator(self.queryset, 5)
+        page = paginator.page(2)
+        self.assertTrue(page.has_next())
+        self.assertEqual(paginator.count, 40)
+        self.assertTrue(paginator.approximate)
+        with self.assertRaises(EmptyPage):
+            paginator.page(7)
+
+        page = EstimatedCountPaginator(self.queryset, 5).page(3)
+        self.assertEqual(len(page), 2)
+        self.assertFalse(page.has_next())
+        self.assertEqual(page.paginator.count, 12)
+        self.assertFalse(page.paginator.approximate)
+        self.assertEqual(page.paginator.num_pages, 3)
+
+    def test_responses_say_whether_the_count_is_approximate(self):
+        client = APIClient()
+        # Counted by the database, as when the catalog index is unavailable
+        self.enterContext(mock.patch.object(catalog, 'get_catalog_index', return_value=None))
+        self.enterContext(mock.patch('utils.pagination.estimate_count', return_value=40))
+        response = client.get('/api/products/', {'page_size': 5, 'sort_by': 'created_at'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 40)
+        self.assertTrue(response.data['count_is_approximate'])
+        self.assertIsNotNone(response.data['next'])
+
+        response = client.get('/api/products/', {'page_size': 5, 'sort_by': 'created_at', 'page': 3})
+        self.assertEqual(response.data['count'], 12)
+        self.assertFalse(response.data['count_is_approximate'])
+        self.assertIsNone(response.data['next'])
+
+
+class SuggestionIndexTests(TestCase):
+    """Prefix suggestions from buckets and bisected ranges, kept in step with catalog writes"""
+
+    def setUp(self):
+        for name, value in (('_index', None), ('_built_at', 0.0), ('_pending', None)):
+            patcher = mock.patch.object(suggest, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def index(self):
+        index = SuggestionIndex()
+        index.update(PRODUCT, 1, 'Bluetooth Speaker', 'bluetooth-speaker', 10)
+        index.update(PRODUCT, 2, 'Speaker Stand', 'speaker-stand', 3)
+        index.update(PRODUCT, 3, 'Spectrum Analyser', 'spectrum-analyser', 3)
+        index.update(BRAND, 4, 'Sparkle', 'sparkle', 7)
+        index.update(CATEGORY, 5, 'Speakers', 'speakers', 3)
+        index.update(PRODUCT, 6, 'Kettle', 'kettle', 50)
+        return index
+
+    @staticmethod
+    def ids(results):
+        return [(item['type'], item['id']) for item in results]
+
+    def test_short_prefixes_and_ranges_rank_alike(self):
+        index = self.index()
+        # 'sp' is read from its bucket, 'spe' from its bucket and 'spea' by bisecting the entries
+        self.assertEqual(
+            self.ids(index.suggest('SP')),
+            [(PRODUCT, 1), (BRAND, 4), (CATEGORY, 5), (PRODUCT, 2), (PRODUCT, 3)],
+        )
+        self.assertEqual(self.ids(index.suggest('spe')), [(PRODUCT, 1), (CATEGORY, 5), (PRODUCT, 2), (PRODUCT, 3)])
+        self.assertEqual(self.ids(index.suggest('spea')), [(PRODUCT, 1), (CATEGORY, 5), (PRODUCT, 2)])
+        self.assertEqual(self.ids(index.suggest('speakers')), [(CATEGORY, 5)])
+        self.assertEqual(self.ids(index.suggest('spe', limit=2)), [(PRODUCT, 1), (CATEGORY, 5)])
+        self.assertEqual(self.ids(index.suggest('spea', limit=2)), [(PRODUCT, 1), (CATEGORY, 5)])
+        self.assertEqual(index.suggest('  '), [])
+        self.assertEqual(index.suggest('zz'), [])
+
+        # Every prefix of every word start agrees between the two paths
+        for prefix in ('b', 'bl', 'blu', 's', 'sp', 'spe', 'k', 'ke', 'ket'):
+            bucket = [(kind, pk) for _, kind, pk in index.buckets[prefix]]
+            matches = {(kind, pk) for key, kind, pk in index.entries if key.startswith(prefix)}
+            self.assertEqual(bucket, sorted(matches, key=index._item_rank))
+
+    def test_updates_and_removals_apply_in_place(self):
+        index = self.index()
+        index.update(PRODUCT, 3, 'Spectrum Analyser', 'spectrum-analyser', 20)
+        self.assertEqual(self.ids(index.suggest('spe'))[:2], [(PRODUCT, 3), (PRODUCT, 1)])
+        self.assertEqual(self.ids(index.suggest('spec')), [(PRODUCT, 3)])
+
+        # A rename without a weight keeps the current one
+        index.update(PRODUCT, 1, 'Wireless Headphones', 'wireless-headphones')
+        self.assertEqual(self.ids(index.suggest('wi')), [(PRODUCT, 1)])
+        self.assertEqual(self.ids(index.suggest('head')), [(PRODUCT, 1)])
+        self.assertNotIn((PRODUCT, 1), self.ids(index.suggest('sp')))
+        self.assertEqual(index.items[(PRODUCT, 1)][2], 10)
+
+        index.remove(BRAND, 4)
+        index.remove(BRAND, 99)
+        self.assertEqual(self.ids(index.suggest('spa')), [])
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.entries, sorted(index.entries))
+        self.assertTrue(all(bucket == sorted(bucket) for bucket in index.buckets.values()))
+
+    def test_brands_and_categories_rank_by_product_demand(self):
+        audio = Category.objects.create(name='Audio')
+        sony = Brand.objects.create(name='Sony')
+        sonos = Brand.objects.create(name='Sonos')
+        soundbar = Product.objects.create(
+            name='Soundbar', description='', price=Decimal('300'), category=audio, brand=sony, sku='SB-1',
+            stock=1, view_count=4, purchase_count=1,
+        )
+        index = SuggestionIndex.from_database()
+        self.assertEqual(index.suggest('so'), [
+            {'id': sony.pk, 'name': 'Sony', 'slug': 'sony', 'type': BRAND},
+            {'id': soundbar.pk, 'name': 'Soundbar', 'slug': 'soundbar', 'type': PRODUCT},
+            {'id': sonos.pk, 'name': 'Sonos', 'slug': 'sonos', 'type': BRAND},
+        ])
+        self.assertEqual(index.items[(BRAND, sony.pk)][2], 10)
+
+    def test_changes_during_a_rebuild_are_replayed(self):
+        category = Category.objects.create(name='Audio')
+        speaker = Product.objects.create(
+            name='Speaker', description='', price=Decimal('50'), category=category, sku='SP-1', stock=5,
+        )
+        self.assertEqual(self.ids(suggest.get_suggestion_index().suggest('spe')), [(PRODUCT, speaker.pk)])
+        build = SuggestionIndex.from_database
+
+        def from_database():
+            index = build()
+            # Writes landing after the rebuild read the catalog, before the swap
+            speaker.name = 'Subwoofer'
+            speaker.save()
+            Product.objects.create(
+                name='Spectrum Analyser', description='', price=Decimal('90'), category=category, sku='SA-1',
+                stock=5,
+            )
+            return index
+
+        with mock.patch.object(SuggestionIndex, 'from_database', from_database):
+            suggest._build()
+        index = suggest.get_suggestion_index()
+        self.assertEqual(self.ids(index.suggest('sub')), [(PRODUCT, speaker.pk)])
+        self.assertEqual([item['name'] for item in index.suggest('spe')], ['Spectrum Analyser'])
+        self.assertIsNone(suggest._pending)
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """ORJSONRenderer must render byte for byte what DRF's JSONRenderer does"""
+
+    def assertParity(self, data):
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_values_render_as_drf_renders_them(self):
+        self.assertParity({
+            'floats': [0.0, -0.0, 0.1, 1 / 3, 0.0001, 1e15, 123.456],
+            'exponents': [1e20, -1.5e16, 1e-05, 2.5e-300, 5e-324],
+            'wide_int': 2 ** 70,
+            'negative_wide_int': [-(2 ** 64)],
+            'decimal': Decimal('19.90'),
+            'text': 'Crème “brûlée”\u2028<script>',
+            'numpy': [np.float32(0.8123), np.arange(3, dtype=np.float32) / 3, np.float64(1e20), np.int64(7)],
+            'when': datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 5, 1),
+            'id': uuid.UUID(int=42),
+            'nested': {1: [{'score': 1e-7}, (True, None)]},
+        })
+        self.assertParity([2 ** 63 - 1, -(2 ** 63), 1e16])
+
+    def test_non_finite_floats_are_rejected(self):
+        for value in (float('nan'), float('inf'), -float('inf'), np.float32('nan'), np.array([1.0, np.inf])):
+            with self.subTest(value=value):
+                with self.assertRaisesMessage(ValueError, 'Out of range float values are not JSON compliant'):
+                    ORJSONRenderer().render({'results': [{'score': value}]})
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render({'results': [{'score': value}]})
+
+    def test_non_strict_mode_writes_nan_as_drf_does(self):
+        renderer = ORJSONRenderer()
+        renderer.strict = False
+        self.assertEqual(renderer.render([float('nan'), float('inf')]), b'[NaN,Infinity]')
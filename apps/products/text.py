@@ -0,0 +1,50 @@
+# Text normalization shared by product search documents and queries
+import re
+import unicodedata
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    """Casefold and strip accents so that 'Café' and 'cafe' match"""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text):
+    """Alphanumeric runs of the normalized text"""
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def name_key(name):
+    """Normalized product name used for indexed prefix matching"""
+    return ' '.join(tokenize(name))[:200]
+
+
+def build_search_document(name, short_description, description, sku, category_name, brand_name):
+    """Space-separated tokens of every searchable product field"""
+    parts = (name, short_description, description, sku, category_name, brand_name)
+    return ' '.join(tokenize(' '.join(part or '' for part in parts)))
+
+
+def trigrams(word):
+    """Character trigrams of a word padded so that its start and end count"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance, giving up early (returning limit + 1) once it exceeds ``limit``"""
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
@@ -0,0 +1,107 @@
+# Write-behind buffer for product view tracking
+import atexit
+import collections
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Product, ProductView
+
+logger = logging.getLogger(__name__)
+
+_events = collections.deque()
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_pid = None
+
+
+def write_product_views(events):
+    """
+    Store ``(product_id, user_id, ip_address, count_repeat)`` view events:
+    one bulk_create of the visitors not seen before, then one UPDATE per
+    distinct view_count increment. Repeat visits only count when
+    ``count_repeat`` is set, as for product pages.
+    """
+    live = set(Product.objects.filter(pk__in={event[0] for event in events}).values_list('pk', flat=True))
+    events = [event for event in events if event[0] in live]
+    if not events:
+        return
+    seen = set(ProductView.objects.filter(
+        product_id__in=live, ip_address__in={event[2] for event in events},
+    ).values_list('product_id', 'user_id', 'ip_address'))
+
+    new_views = []
+    counts = collections.Counter()
+    for product_id, user_id, ip_address, count_repeat in events:
+        first = (product_id, user_id, ip_address) not in seen
+        if first:
+            seen.add((product_id, user_id, ip_address))
+            new_views.append(ProductView(product_id=product_id, user_id=user_id, ip_address=ip_address))
+        if first or count_repeat:
+            counts[product_id] += 1
+
+    by_increment = collections.defaultdict(list)
+    for product_id, count in counts.items():
+        by_increment[count].append(product_id)
+    with transaction.atomic():
+        # Other processes may have stored the same visitor meanwhile
+        ProductView.objects.bulk_create(new_views, batch_size=500, ignore_conflicts=True)
+        for count, product_ids in by_increment.items():
+            Product.objects.filter(pk__in=product_ids).update(view_count=F('view_count') + count)
+
+
+def flush_product_views():
+    """Write every buffered view event now"""
+    with _lock:
+        events = list(_events)
+        _events.clear()
+    if events:
+        write_product_views(events)
+
+
+def _flush_loop():
+    while True:
+        _wakeup.wait(getattr(settings, 'PRODUCT_VIEW_FLUSH_INTERVAL', 5))
+        _wakeup.clear()
+        try:
+            flush_product_views()
+        except Exception:
+            logger.exception('Could not write buffered product views')
+        finally:
+            connection.close()
+
+
+def _start_flusher():
+    """Buffer and flush thread of this process (forked workers start their own)"""
+    global _events, _pid
+    with _lock:
+        if _pid == os.getpid():
+            return
+        # Full buffers drop their oldest events
+        _events = collections.deque(maxlen=getattr(settings, 'PRODUCT_VIEW_BUFFER_SIZE', 10000))
+        _pid = os.getpid()
+    threading.Thread(target=_flush_loop, daemon=True).start()
+    atexit.register(flush_product_views)
+
+
+def record_product_view(product_id, user_id, ip_address, count_repeat=True):
+    """
+    Queue a product view for the background flush, which runs every
+    PRODUCT_VIEW_FLUSH_INTERVAL seconds (sooner when the buffer fills up),
+    so requests never wait on these writes. The interval is what a crashed
+    process can lose; 0 writes each view during the request instead.
+    """
+    event = (product_id, user_id, ip_address, count_repeat)
+    if not getattr(settings, 'PRODUCT_VIEW_FLUSH_INTERVAL', 5):
+        write_product_views([event])
+        return
+    if _pid != os.getpid():
+        _start_flusher()
+    with _lock:
+        _events.append(event)
+        if len(_events) * 2 >= _events.maxlen:
+            _wakeup.set()
@@ -11,6 +11,8 @@ urlpatterns = [
 
     
     path('search/', views.ProductSearchView.as_view(), name='product-search'),
+    path('suggest/', views.ProductSuggestView.as_view(), name='product-suggest'),
+    path('facets/', views.ProductFacetsView.as_view(), name='product-facets'),
     
     # Product CRUD
     path('', views.ProductListCreateView.as_view(), name='product-list-create'),
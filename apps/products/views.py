@@ -1,6 +1,6 @@
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
-from django.db.models import Q, Avg, Count, F
+from django.db.models import Q, Avg, Count, F, QuerySet
 from django.core.paginator import Paginator
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.views import View
@@ -13,38 +13,86 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError as DRFValidationError
 import json
 from datetime import datetime, timedelta
 from django.utils import timezone
+from utils.cache import CachedResponseMixin, ConditionalGetMixin, bump_generation
+from utils.fieldsets import SparseFieldsetMixin
+from utils.pagination import EstimatedCountPaginationMixin, KeysetPaginationMixin
 
 #for returning product details with the help of sku
 from .models import Product
 from .serializers import ProductSerializer
 
 
-from .models import Product, Category, Brand, ProductImage, ProductAttribute, ProductReview, ProductView
+from .models import Product, Category, Brand, ProductImage, ProductAttribute, ProductReview, ProductView, sync_primary_image
 from .serializers import (
-    ProductSerializer, ProductDetailSerializer, BrandSerializer, 
+    ProductSerializer, ProductDetailSerializer, ProductRowSerializer, BrandSerializer, 
     ProductImageSerializer, ProductAttributeSerializer, ProductReviewSerializer
 )
+from apps.image_search.duplicates import find_duplicate_image, find_identical_image
+from apps.image_search.image_processor import image_phash
+from .catalog import DEFAULT_SORT, CatalogListMixin, index_filters, reset_catalog_index, sort_ordering
+from .facets import facet_counts
+from .filters import ProductFilter
+from .search import refresh_search_documents, reset_search_index, search_products
+from .suggest import expire_suggestion_index, get_suggestion_index
+from .tracking import record_product_view
 
 # ============================================================================
 # PAGINATION CLASS
 # ============================================================================
 
-class ProductPagination(PageNumberPagination):
-    """Custom pagination for products"""
+class ProductPagination(KeysetPaginationMixin, EstimatedCountPaginationMixin, PageNumberPagination):
+    """Custom pagination for products; pass ``cursor`` (empty for the first page) for keyset pages"""
     page_size = 12  # Number of products per page
     page_size_query_param = 'page_size'  # Allow client to override page size
     max_page_size = 50  # Maximum page size allowed
     page_query_param = 'page'  # URL parameter for page number
+    keyset_fields = ('price', 'name_key', 'created_at', 'rating_average')  # Sort columns cursor pages support
+
+class ProductRowListMixin(SparseFieldsetMixin):
+    """
+    GET lists serialized by ProductRowSerializer from ``.values()`` rows
+    instead of model instances; writes keep using ``serializer_class``.
+    Sparse fieldsets (``?projection=card``, ``?fields=``, ``?omit=``) read
+    only the columns of the requested fields.
+    """
+    
+    def row_columns(self, queryset=None):
+        columns = ProductRowSerializer.columns_for(self.get_fieldset())
+        if queryset is not None:
+            # Cursors are built from the sort column of the page's last row
+            ordering = (name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str))
+            keyset_fields = getattr(self.paginator, 'keyset_fields', ())
+            columns += tuple(name for name in ordering if name in keyset_fields and name not in columns)
+        return columns
+    
+    def paginate_queryset(self, queryset):
+        if self.request.method == 'GET' and isinstance(queryset, QuerySet):
+            queryset = queryset.values(*self.row_columns(queryset))
+        return super().paginate_queryset(queryset)
+    
+    def catalog_page(self, ids):
+        rows = Product.objects.filter(is_active=True, pk__in=ids).values(*self.row_columns())
+        rows = {row['id']: row for row in rows}
+        return [rows[pk] for pk in ids if pk in rows]
+    
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET' and kwargs.get('many'):
+            return ProductRowSerializer(
+                args[0], context=self.get_serializer_context(), fields=self.get_fieldset(),
+            )
+        return super().get_serializer(*args, **kwargs)
 
 # ============================================================================
 # PRODUCT VIEWS
 # ============================================================================
 
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductListCreateView(CachedResponseMixin, ProductRowListMixin, CatalogListMixin, generics.ListCreateAPIView):
     """List all products or create a new product with server-side pagination"""
+    cache_entities = ('product', 'category', 'brand')
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -79,161 +127,143 @@ class ProductListCreateView(generics.ListCreateAPIView):
         # Sorting
         sort_by = self.request.query_params.get('sort_by', '-created_at')
         if sort_by in ['price', '-price', 'name', '-name', 'created_at', '-created_at', 'rating_average', '-rating_average']:
-            queryset = queryset.order_by(sort_by)
+            queryset = queryset.order_by(*sort_ordering(sort_by))
         
-        return queryset.select_related('category', 'brand').prefetch_related('images')
+        return queryset.select_related('category', 'brand')
+    
+    def catalog_filters(self):
+        filterset = ProductFilter(self.request.query_params, queryset=Product.objects.none())
+        if not filterset.is_valid():
+            raise DRFValidationError(filterset.errors)
+        supported = ('category', 'brand', 'min_price', 'max_price', 'stock_status')
+        return index_filters({
+            name: value for name, value in filterset.form.cleaned_data.items() if name in supported
+        })
+
+def track_product_view(request, product_id, count_repeat=True):
+    """Queue a view of a product for the write-behind buffer (see tracking.py)"""
+    if request.user.is_authenticated or request.META.get('REMOTE_ADDR'):
+        record_product_view(
+            product_id,
+            request.user.pk if request.user.is_authenticated else None,
+            request.META.get('REMOTE_ADDR', '127.0.0.1'),
+            count_repeat=count_repeat,
+        )
 
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ProductDetailView(ConditionalGetMixin, SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a product"""
+    # Reviews and attributes bump 'product' too; view_count alone does not
+    cache_entities = ('product', 'category', 'brand')
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductDetailSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
+    def not_modified(self, request, *args, **kwargs):
+        # A revalidated page is still a view
+        track_product_view(request, self.kwargs['pk'])
+    
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        
-        # Track product view
-        if request.user.is_authenticated or request.META.get('REMOTE_ADDR'):
-            ProductView.objects.get_or_create(
-                product=instance,
-                user=request.user if request.user.is_authenticated else None,
-                ip_address=request.META.get('REMOTE_ADDR', '127.0.0.1')
-            )
-            # Update view count
-            Product.objects.filter(pk=instance.pk).update(view_count=F('view_count') + 1)
-        
+        track_product_view(request, instance.pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
-class ProductBySlugView(generics.RetrieveAPIView):
+class ProductBySlugView(ConditionalGetMixin, SparseFieldsetMixin, generics.RetrieveAPIView):
     """Get product by slug"""
+    cache_entities = ('product', 'category', 'brand')
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductDetailSerializer
     lookup_field = 'slug'
     
+    def not_modified(self, request, *args, **kwargs):
+        product_id = self.get_queryset().filter(slug=self.kwargs['slug']).values_list('pk', flat=True).first()
+        if product_id is not None:
+            track_product_view(request, product_id)
+    
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        
-        # Track product view
-        if request.user.is_authenticated or request.META.get('REMOTE_ADDR'):
-            ProductView.objects.get_or_create(
-                product=instance,
-                user=request.user if request.user.is_authenticated else None,
-                ip_address=request.META.get('REMOTE_ADDR', '127.0.0.1')
-            )
-            # Update view count
-            instance.view_count = F('view_count') + 1
-            instance.save(update_fields=['view_count'])
-        
+        track_product_view(request, instance.pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
-class ProductSearchView(generics.ListAPIView):
-    """Simple search products by name, description, category, brand, and SKU"""
+class ProductSearchView(SparseFieldsetMixin, generics.ListAPIView):
+    """Search products by name, description, category, brand and SKU, ranked by BM25"""
     serializer_class = ProductSerializer
     pagination_class = ProductPagination
     
     def get_queryset(self):
-        query = self.request.query_params.get('q', '').strip()
-        if not query:
-            return Product.objects.none()
-        
-        # Simple search across multiple fields
-        search_condition = (
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(short_description__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(brand__name__icontains=query) |
-            Q(sku__icontains=query)
-        )
-        
-        # Apply search filter
-        queryset = Product.objects.filter(
-            is_active=True
-        ).filter(search_condition).select_related('category', 'brand')
-        
-        # Enhanced ordering: First word matches first, then alphabetical
-        # Use CASE WHEN to prioritize results where name starts with the query
-        from django.db.models import Case, When, IntegerField
-        
-        queryset = queryset.annotate(
-            search_priority=Case(
-                # Exact match at the beginning gets highest priority (1)
-                When(name__istartswith=query, then=1),
-                # First word match gets second priority (2)
-                When(name__iregex=r'^' + query.split()[0], then=2),
-                # Contains match gets third priority (3)
-                When(name__icontains=query, then=3),
-                # Other field matches get lowest priority (4)
-                default=4,
-                output_field=IntegerField()
-            )
-        ).order_by('search_priority', 'name')
-        
-        return queryset
+        return Product.objects.filter(is_active=True).select_related('category', 'brand')
+    
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        product_ids = search_products(query) if query else []
+        
+        # Paginate the ranked ids, then load only the products on this page
+        page = self.paginate_queryset(product_ids)
+        products = self.get_queryset().in_bulk(page)
+        # Products deactivated since the index was built drop out
+        serializer = self.get_serializer([products[pk] for pk in page if pk in products], many=True)
+        response = self.get_paginated_response(serializer.data)
+        # Set when misspelled words were corrected to find more results
+        response.data['corrected_query'] = getattr(product_ids, 'corrected_query', None)
+        return response
+
+class ProductSuggestView(APIView):
+    """Search-box suggestions (products, brands, categories) served from memory"""
+    # Anonymous and read-only; skipping JWT decoding keeps it cheap per keystroke
+    authentication_classes = []
+    permission_classes = []
+    
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+        except ValueError:
+            limit = 8
+        return Response({'query': query, 'results': get_suggestion_index().suggest(query, limit)})
 
-class ProductFilterView(generics.ListAPIView):
+class ProductFilterView(CachedResponseMixin, ProductRowListMixin, CatalogListMixin, generics.ListAPIView):
     """Advanced product filtering with server-side pagination"""
+    cache_entities = ('product', 'category', 'brand')
     serializer_class = ProductSerializer
     pagination_class = ProductPagination
     
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True)
-        
-        # Category filter
-        category_id = self.request.query_params.get('category')
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
-        
-        # Brand filter
-        brand_id = self.request.query_params.get('brand')
-        if brand_id:
-            queryset = queryset.filter(brand_id=brand_id)
-        
-        # Price range filter
-        min_price = self.request.query_params.get('min_price')
-        max_price = self.request.query_params.get('max_price')
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
-        
-        # Stock status filter
-        stock_status = self.request.query_params.get('stock_status')
-        if stock_status:
-            queryset = queryset.filter(stock_status=stock_status)
-        
-        # Rating filter
-        min_rating = self.request.query_params.get('min_rating')
-        if min_rating:
-            queryset = queryset.filter(rating_average__gte=min_rating)
-        
-        # Search filter
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search) |
-                Q(category__name__icontains=search) |
-                Q(brand__name__icontains=search)
-            )
+        # Category, brand, price, stock status, rating and search filters
+        filterset = ProductFilter(self.request.query_params, queryset=Product.objects.filter(is_active=True))
+        if not filterset.is_valid():
+            raise DRFValidationError(filterset.errors)
+        queryset = filterset.qs
         
         # Sorting
         sort_by = self.request.query_params.get('sort_by', '-created_at')
         if sort_by in ['price', '-price', 'name', '-name', 'created_at', '-created_at', 'rating_average', '-rating_average']:
-            queryset = queryset.order_by(sort_by)
+            queryset = queryset.order_by(*sort_ordering(sort_by))
         
-        return queryset.select_related('category', 'brand').prefetch_related('images')
+        return queryset.select_related('category', 'brand')
+    
+    def catalog_filters(self):
+        filterset = ProductFilter(self.request.query_params, queryset=Product.objects.none())
+        if not filterset.is_valid():
+            raise DRFValidationError(filterset.errors)
+        return index_filters(filterset.form.cleaned_data)
+
+class ProductFacetsView(APIView):
+    """Facet counts for the filter sidebar; takes the same query params as ProductFilterView"""
+    
+    def get(self, request):
+        return Response(facet_counts(request.query_params))
 
-class FeaturedProductsView(generics.ListAPIView):
+class FeaturedProductsView(CachedResponseMixin, ProductRowListMixin, generics.ListAPIView):
     """Get featured products with server-side pagination"""
-    queryset = Product.objects.filter(is_active=True, is_featured=True)
+    cache_entities = ('product', 'category', 'brand')
+    queryset = Product.objects.filter(is_active=True, is_featured=True).select_related('category', 'brand')
     serializer_class = ProductSerializer
     pagination_class = ProductPagination
 
-class TrendingProductsView(generics.ListAPIView):
+class TrendingProductsView(CachedResponseMixin, SparseFieldsetMixin, generics.ListAPIView):
     """Get trending products with server-side pagination"""
+    cache_entities = ('product', 'category', 'brand')
     serializer_class = ProductSerializer
     pagination_class = ProductPagination
     
@@ -247,8 +277,9 @@ class TrendingProductsView(generics.ListAPIView):
             view_count=Count('views')
         ).order_by('-view_count', '-created_at')
 
-class OnSaleProductsView(generics.ListAPIView):
+class OnSaleProductsView(CachedResponseMixin, SparseFieldsetMixin, generics.ListAPIView):
     """Get products on sale with server-side pagination"""
+    cache_entities = ('product', 'category', 'brand')
     serializer_class = ProductSerializer
     pagination_class = ProductPagination
     
@@ -271,10 +302,37 @@ class ProductImageListCreateView(generics.ListCreateAPIView):
         product_id = self.kwargs['product_id']
         return ProductImage.objects.filter(product_id=product_id)
     
+    def create(self, request, *args, **kwargs):
+        self.near_duplicate = None
+        response = super().create(request, *args, **kwargs)
+        if self.near_duplicate is not None:
+            # Reported, not merged: a phash match may be a colour variant
+            response.data['near_duplicate'] = {
+                'id': self.near_duplicate.pk,
+                'product': self.near_duplicate.product_id,
+            }
+        return response
+    
     def perform_create(self, serializer):
         product_id = self.kwargs['product_id']
         product = get_object_or_404(Product, id=product_id)
-        serializer.save(product=product)
+        
+        upload = serializer.validated_data['image']
+        phash = image_phash(upload)
+        identical = find_identical_image(phash, upload)
+        if identical is None:
+            self.near_duplicate = find_duplicate_image(phash)
+            serializer.save(product=product, phash=phash)
+        elif identical.product_id == product.id:
+            raise DRFValidationError({'image': 'This product already has this image.'})
+        else:
+            # Share the stored file and its embedding instead of keeping a copy
+            serializer.save(
+                product=product,
+                image=identical.image.name,
+                phash=identical.phash,
+                feature_vector=identical.feature_vector,
+            )
 
 class ProductImageDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a product image"""
@@ -312,6 +370,8 @@ class ProductPrimaryImageView(APIView):
             serializer = ProductImageSerializer(image)
             return Response(serializer.data)
         except ProductImage.DoesNotExist:
+            # The old primary was already cleared above
+            sync_primary_image(product_id)
             return Response({'detail': 'Image not found'}, status=404)
 
 # ============================================================================
@@ -367,7 +427,8 @@ class ProductReviewListCreateView(generics.ListCreateAPIView):
         
         product.rating_average = round(avg_rating, 2)
         product.rating_count = review_count
-        product.save(update_fields=['rating_average', 'rating_count'])
+        # updated_at too: catalog signatures watch it
+        product.save(update_fields=['rating_average', 'rating_count', 'updated_at'])
 
 class ProductReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a product review"""
@@ -409,16 +470,8 @@ class ProductViewCreateView(generics.CreateAPIView):
     def post(self, request, product_id):
         product = get_object_or_404(Product, id=product_id)
         
-        view, created = ProductView.objects.get_or_create(
-            product=product,
-            user=request.user if request.user.is_authenticated else None,
-            ip_address=request.META.get('REMOTE_ADDR', '127.0.0.1')
-        )
-        
-        if created:
-            # Update view count
-            product.view_count = F('view_count') + 1
-            product.save(update_fields=['view_count'])
+        # Only a visitor's first view is counted
+        track_product_view(request, product.pk, count_repeat=False)
         
         return Response({'status': 'view tracked'})
 
@@ -453,8 +506,9 @@ class ProductAnalyticsView(APIView):
 # BRAND VIEWS
 # ============================================================================
 
-class BrandListCreateView(generics.ListCreateAPIView):
+class BrandListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
     """List all brands or create a new brand"""
+    cache_entities = ('brand',)
     queryset = Brand.objects.filter(is_active=True)
     serializer_class = BrandSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -471,17 +525,24 @@ class BrandBySlugView(generics.RetrieveAPIView):
     serializer_class = BrandSerializer
     lookup_field = 'slug'
 
-class BrandProductsView(generics.ListAPIView):
+class BrandProductsView(CachedResponseMixin, ProductRowListMixin, CatalogListMixin, generics.ListAPIView):
     """Get products by brand with server-side pagination"""
+    cache_entities = ('product', 'category', 'brand')
     serializer_class = ProductSerializer
     pagination_class = ProductPagination
     
+    def catalog_filters(self):
+        return {'brand': int(self.kwargs['brand_id'])}
+    
+    def catalog_sort(self):
+        return DEFAULT_SORT
+    
     def get_queryset(self):
         brand_id = self.kwargs.get('brand_id')
         return Product.objects.filter(
             is_active=True,
             brand_id=brand_id
-        ).select_related('category', 'brand').prefetch_related('images')
+        ).select_related('category', 'brand')
 
 # ============================================================================
 # BULK OPERATIONS
@@ -498,8 +559,16 @@ class ProductBulkUpdateView(APIView):
         if not product_ids:
             return Response({'detail': 'product_ids is required'}, status=400)
         
-        # Update products
-        updated_count = Product.objects.filter(id__in=product_ids).update(**update_data)
+        # Update products (updated_at too: .update() skips auto_now and the search index watches it)
+        products = Product.objects.filter(id__in=product_ids)
+        updated_count = products.update(**{'updated_at': timezone.now(), **update_data})
+        if Product.SEARCH_SOURCE_FIELDS.intersection(update_data):
+            refresh_search_documents(products)
+        else:
+            reset_search_index()
+        expire_suggestion_index()
+        reset_catalog_index()
+        bump_generation('product')
         
         return Response({
             'updated_count': updated_count,
@@ -517,7 +586,11 @@ class ProductBulkDeleteView(APIView):
             return Response({'detail': 'product_ids is required'}, status=400)
         
         # Soft delete by setting is_active to False
-        updated_count = Product.objects.filter(id__in=product_ids).update(is_active=False)
+        updated_count = Product.objects.filter(id__in=product_ids).update(is_active=False, updated_at=timezone.now())
+        reset_search_index()
+        expire_suggestion_index()
+        reset_catalog_index()
+        bump_generation('product')
         
         return Response({
             'deleted_count': updated_count,
@@ -113,6 +113,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'majorproject.wsgi.application'
+ASGI_APPLICATION = 'majorproject.asgi.application'
 
 
 # Database
@@ -197,13 +198,58 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
 MAX_UPLOAD_SIZE = 5242880  # 5MB
 
+# Image search: approximate index written by `manage.py build_image_index`
+IMAGE_SEARCH_INDEX_PATH = os.path.join(BASE_DIR, 'indexes', 'image_ivfpq.npz')
+IMAGE_SEARCH_USE_ANN = False  # Shortlist with the IVF-PQ file instead of scanning every vector
+IMAGE_SEARCH_NPROBE = 16  # Inverted lists scanned per query (recall vs latency)
+IMAGE_SEARCH_RERANK = 4  # IVF-PQ shortlists rerank * k products, re-ranked by exact score
+IMAGE_SEARCH_CHECK_INTERVAL = 30  # Seconds between checks for embeddings or catalog changes made by other processes
+IMAGE_SEARCH_CACHE_SIZE = 1024  # Cached queries, keyed by uploaded image hash
+IMAGE_SEARCH_CACHE_TTL = 600  # Seconds
+IMAGE_SEARCH_DUPLICATE_RADIUS = 4  # Max perceptual-hash bits apart for a near-duplicate
+IMAGE_SEARCH_WORKERS = None  # Decode/feature processes per server process (None: min(4, CPUs))
+IMAGE_SEARCH_MAX_INFLIGHT = 16  # Concurrent searches before answering 503
+
+# Product text search: in-memory BM25 index over Product.search_document
+PRODUCT_SEARCH_CHECK_INTERVAL = 30  # Seconds between checks for catalog changes made by other processes
+PRODUCT_SEARCH_PREFIX_EXPANSIONS = 50  # Vocabulary terms the last (still being typed) query word may expand to
+PRODUCT_SEARCH_FUZZY_MIN_RESULTS = 3  # Fewer exact matches than this also searches the typo-corrected query
+PRODUCT_SUGGEST_REFRESH = 600  # Seconds between background rebuilds of the suggestion index
+PRODUCT_FACET_PRICE_BUCKETS = (25, 50, 100, 250, 500, 1000)  # Upper edges of the price facet buckets
+PRODUCT_FACET_CACHE_SIZE = 512  # Cached facet responses, keyed by normalized filters
+PRODUCT_FACET_CACHE_TTL = 60  # Seconds
+PRODUCT_CATALOG_CHECK_INTERVAL = 30  # Seconds between checks of the catalog listing index for other processes' writes
+PRODUCT_VIEW_FLUSH_INTERVAL = 5  # Seconds product views are buffered before being written, i.e. what a crash can lose (0 writes them in the request)
+PRODUCT_VIEW_BUFFER_SIZE = 10000  # Buffered product views per process; when full the oldest are dropped
+
 REST_USE_JWT = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'utils.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'utils.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+}
+
+# Shared cache backend in production (e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache,
+# CACHE_LOCATION=redis://cache:6379/1); per-process memory by default and in tests
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
 }
+RESPONSE_CACHE_TIMEOUT = 300  # Seconds a cached catalog GET response lives (writes retire it sooner)
+PAGINATION_EXACT_COUNT_THRESHOLD = 1000  # Paginated result sets up to this size are counted exactly
+PAGINATION_COUNT_CACHE_TTL = 300  # Seconds a count of a larger result set is reused
 
 # Email backend configuration for password reset (production)
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
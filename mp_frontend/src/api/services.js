@@ -15,6 +15,10 @@ export const productsAPI = {
     const queryParams = { q: query, ...params };
     return api.get('/products/search/', { params: queryParams });
   },
+  suggest: (query, params = {}) => {
+    const queryParams = { q: query, ...params };
+    return api.get('/products/suggest/', { params: queryParams });
+  },
 };
 
 // Categories API
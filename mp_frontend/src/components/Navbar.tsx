@@ -163,32 +163,15 @@ export default function Navbar() {
     formData.append("file", searchImage);
 
     try {
-      // Step 1: Get similar products from image processing service
-      const fastApiResponse = await axios.post("http://localhost:8001/search-image/", formData, {
+      // Similar products come back fully serialized with their similarity score
+      const response = await axios.post("http://localhost:8000/api/image-search/", formData, {
         headers: { "Content-Type": "multipart/form-data" }
       });
 
-      const matchedResults = fastApiResponse.data.results;
-      const skuList = matchedResults.map((item: { sku: string }) => item.sku);
+      const mergedResults: Product[] = response.data.results;
 
-      if (skuList.length > 0) {
-        // Step 2: Get full product details from main API
-        const djangoResponse = await axios.post("http://localhost:8000/api/products/by-skus/", {
-          skus: skuList
-        });
-
-        const products: Product[] = djangoResponse.data;
-
-        // Step 3: Combine data with similarity scores
-        const mergedResults = products.map(product => {
-          const match = matchedResults.find((m: { sku: string }) => m.sku === String(product.sku));
-          return {
-            ...product,
-            similarity: match?.similarity ?? null
-          };
-        });
-
-        // Step 4: Navigate to results page
+      if (mergedResults.length > 0) {
+        // Navigate to results page
         navigate("/search-results", { 
           state: { 
             results: mergedResults, 
@@ -35,17 +35,9 @@ const SearchSuggestions = ({ query, isVisible, onSelectSuggestion, onClose }: Se
     const fetchSuggestions = async () => {
       setLoading(true);
       try {
-        // Search for products that match the query
-        const response = await productsAPI.search(query.trim(), { page_size: 5 });
-        const products = response.data.results || response.data;
-        
-        const productSuggestions: SearchSuggestion[] = products.map((product: any) => ({
-          id: product.id,
-          name: product.name,
-          type: 'product' as const
-        }));
-
-        setSuggestions(productSuggestions);
+        // Product, brand and category names starting with the query
+        const response = await productsAPI.suggest(query.trim(), { limit: 8 });
+        setSuggestions(response.data.results as SearchSuggestion[]);
       } catch (error) {
         console.error('Error fetching suggestions:', error);
         setSuggestions([]);
@@ -54,8 +46,8 @@ const SearchSuggestions = ({ query, isVisible, onSelectSuggestion, onClose }: Se
       }
     };
 
-    // Debounce the search
-    const timeoutId = setTimeout(fetchSuggestions, 300);
+    // Debounce the lookup
+    const timeoutId = setTimeout(fetchSuggestions, 100);
     return () => clearTimeout(timeoutId);
   }, [query, isVisible]);
 
@@ -95,11 +87,11 @@ const SearchSuggestions = ({ query, isVisible, onSelectSuggestion, onClose }: Se
           {/* Search suggestions */}
           <div className="px-4 py-2">
             <h3 className="text-xs font-semibold text-gray-500 dark:text-gray-400 uppercase tracking-wide mb-2">
-              Products
+              Suggestions
             </h3>
             {suggestions.map((suggestion) => (
               <button
-                key={suggestion.id}
+                key={`${suggestion.type}-${suggestion.id}`}
                 onClick={() => onSelectSuggestion(suggestion.name)}
                 className="w-full flex items-center gap-3 px-3 py-2 text-left hover:bg-gray-50 dark:hover:bg-gray-800 transition-colors rounded-md"
               >
@@ -107,6 +99,9 @@ const SearchSuggestions = ({ query, isVisible, onSelectSuggestion, onClose }: Se
                 <span className="text-sm text-gray-700 dark:text-gray-300">
                   {suggestion.name}
                 </span>
+                {suggestion.type !== 'product' && (
+                  <span className="ml-auto text-xs text-gray-400 capitalize">{suggestion.type}</span>
+                )}
               </button>
             ))}
           </div>
@@ -0,0 +1,128 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def generation_key(entity):
+    return f'generation:{entity}'
+
+
+def modified_key(entity):
+    return f'modified:{entity}'
+
+
+def get_generations(entities):
+    """Current generation counter of each entity (e.g. 'product')"""
+    keys = [generation_key(entity) for entity in entities]
+    generations = cache.get_many(keys)
+    for entity, key in zip(entities, keys):
+        if key not in generations:
+            # Start from a never used value, so a counter lost to eviction
+            # cannot come back to a generation that old entries are keyed by
+            cache.add(key, time.time_ns(), None)
+            # Unknown modification time: claim now, which is never too early
+            cache.add(modified_key(entity), time.time(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def get_last_modified(entities):
+    """Latest bump time (epoch seconds) of the entities, or None if unknown"""
+    times = cache.get_many([modified_key(entity) for entity in entities])
+    return max(times.values()) if times else None
+
+
+def bump_generation(*entities):
+    """Move entities to a new generation, retiring every response cached under the old one"""
+    for entity in entities:
+        key = generation_key(entity)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+        cache.set(modified_key(entity), time.time(), None)
+
+
+def generation_window():
+    """Seconds a generation signature is used before it is renewed"""
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET for views whose output only changes with the entities in
+    ``cache_entities``. The ETag hashes the view, its URL kwargs, the host,
+    the normalized query params and the entities' generation counters, and
+    Last-Modified is their latest bump, so a matching If-None-Match or
+    If-Modified-Since gets its 304 before anything is queried or serialized.
+
+    Counters written without signals (view_count, see products.tracking)
+    bump no generation, so both validators also move on every
+    RESPONSE_CACHE_TIMEOUT window. The ETags are weak: within a window
+    the counters in a 304'd body may be stale.
+    """
+    cache_entities = ()
+
+    def get_generation_signature(self, request, kwargs):
+        params = sorted(request.query_params.lists())
+        signature = repr((request.get_host(), request.scheme, sorted(kwargs.items()), params))
+        generations = '.'.join(str(generation) for generation in get_generations(self.cache_entities))
+        window = int(time.time() // generation_window())
+        digest = hashlib.sha1(signature.encode()).hexdigest()
+        return f'{type(self).__module__}.{type(self).__qualname__}:{digest}:{generations}:{window}'
+
+    def get_last_modified(self):
+        window_start = time.time() // generation_window() * generation_window()
+        return int(max(get_last_modified(self.cache_entities) or 0, window_start))
+
+    def not_modified(self, request, *args, **kwargs):
+        """Hook for work a 304 must still do"""
+
+    def get_response(self, request, signature, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        signature = self.get_generation_signature(request, kwargs)
+        etag = 'W/"%s"' % hashlib.sha1(signature.encode()).hexdigest()
+        last_modified = self.get_last_modified()
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            if response.status_code == 304:
+                self.not_modified(request, *args, **kwargs)
+        else:
+            response = self.get_response(request, signature, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            # Browsers revalidate instead of guessing freshness from Last-Modified
+            patch_cache_control(response, no_cache=True)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class CachedResponseMixin(ConditionalGetMixin):
+    """
+    Conditional GET that also caches successful response data for
+    RESPONSE_CACHE_TIMEOUT seconds under the generation signature; writes
+    bump generations (see products.signals), so a changed catalog is never
+    served from cache and no keys need to be found or deleted. In-process
+    indexes the views read (products.catalog, image_search.vector_index)
+    record the generations they were built under and rebuild when those
+    move, so a new signature is never filled from data older than it.
+    """
+
+    def get_response(self, request, signature, *args, **kwargs):
+        key = f'response:{signature}'
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().get_response(request, signature, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+        return response
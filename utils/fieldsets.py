@@ -0,0 +1,108 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    ModelSerializer rendering only the Meta.fields named by ``fields``.
+    ``projections`` names common subsets (e.g. ``card``); ``field_columns``
+    lists the model columns behind fields that are not plain model fields.
+    """
+    projections = {}
+    field_columns = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def requested_fields(serializer_class, query_params):
+    """
+    Fields selected by ``?projection=``, ``?fields=`` and ``?omit=`` (comma
+    separated), in Meta.fields order; None when the request wants them all
+    """
+    available = list(serializer_class.Meta.fields)
+    projection = query_params.get('projection', 'full')
+    fields = query_params.get('fields')
+    omit = query_params.get('omit')
+    if projection == 'full' and not fields and not omit:
+        return None
+
+    if projection == 'full':
+        selected = set(available)
+    elif projection in serializer_class.projections:
+        selected = set(serializer_class.projections[projection])
+    else:
+        choices = ', '.join(['full', *serializer_class.projections])
+        raise ValidationError({'projection': f'Unknown projection "{projection}", expected one of: {choices}.'})
+    errors = {}
+    if fields:
+        selected = set(name.strip() for name in fields.split(',') if name.strip())
+        unknown = selected.difference(available)
+        if unknown:
+            errors['fields'] = f'Unknown fields: {", ".join(sorted(unknown))}.'
+    if omit:
+        omitted = set(name.strip() for name in omit.split(',') if name.strip())
+        unknown = omitted.difference(available)
+        if unknown:
+            errors['omit'] = f'Unknown fields: {", ".join(sorted(unknown))}.'
+        selected -= omitted
+    if errors:
+        raise ValidationError(errors)
+    return tuple(name for name in available if name in selected)
+
+
+def fieldset_columns(serializer_class, fields):
+    """Model columns (``.only()`` names) that rendering ``fields`` reads"""
+    model = serializer_class.Meta.model
+    columns = []
+    for name in fields:
+        if name in serializer_class.field_columns:
+            columns.extend(serializer_class.field_columns[name])
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        # Reverse relations (e.g. nested images) are not columns
+        if field.concrete:
+            columns.append(name)
+    return list(dict.fromkeys(columns))
+
+
+class SparseFieldsetMixin:
+    """
+    View mixin for sparse fieldsets on GET: the serializer renders only the
+    requested fields and ``get_queryset`` reads only their columns, joining
+    only the relations they need.
+    """
+
+    def get_fieldset(self):
+        if self.request.method != 'GET':
+            return None
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = requested_fields(self.get_serializer_class(), self.request.query_params)
+        return self._fieldset
+
+    def restrict_columns(self, queryset):
+        fields = self.get_fieldset()
+        if fields is None:
+            return queryset
+        columns = fieldset_columns(self.get_serializer_class(), fields)
+        related = list(dict.fromkeys(column.split('__')[0] for column in columns if '__' in column))
+        # A deferred relation cannot be select_related
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns or ['pk'])
+
+    def get_queryset(self):
+        return self.restrict_columns(super().get_queryset())
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_fieldset()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
@@ -1,7 +1,225 @@
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPaginationMixin:
+    """
+    Cursor mode for a PageNumberPagination, used when the request carries a
+    ``cursor`` param (empty for the first page). Pages continue after the
+    ``(sort value, id)`` of the previous page's last row, so every page is
+    a range read on the sort index however deep it is, and no total is
+    counted. The sort comes from the queryset's own ordering and must be
+    one of ``keyset_fields``; other orderings keep page numbers.
+    """
+    cursor_query_param = 'cursor'
+    keyset_fields = ()
+
+    def keyset_requested(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        ordering = self.get_keyset_ordering(queryset)
+        if ordering is None or not self.keyset_requested(request):
+            return super().paginate_queryset(queryset, request, view)
+
+        field, descending = ordering
+        self.keyset = ordering
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.keyset_order_by(field, descending))
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor, queryset.model, field)
+            after = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{after}': value}) | Q(**{field: value, f'pk__{after}': pk})
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page_rows = rows[:page_size]
+        return self.page_rows
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def get_keyset_ordering(self, queryset):
+        """``(field, descending)`` of the queryset's primary sort, or None if it cannot be keyset paginated"""
+        if not isinstance(queryset, QuerySet):
+            return None
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if not ordering or not isinstance(ordering[0], str):
+            return None
+        field = ordering[0].lstrip('-')
+        if field not in self.keyset_fields:
+            return None
+        return field, ordering[0].startswith('-')
+
+    @staticmethod
+    def keyset_order_by(field, descending):
+        # id breaks ties, in the same direction, so the order is total
+        return (f'-{field}', '-pk') if descending else (field, 'pk')
+
+    def get_next_cursor_link(self):
+        if not self.has_next:
+            return None
+        last = self.page_rows[-1]
+        field = self.keyset[0]
+        # Rows may be model instances or .values() dicts
+        value, pk = (last[field], last['id']) if isinstance(last, dict) else (getattr(last, field), last.pk)
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(field, value, pk))
+
+    @staticmethod
+    def encode_cursor(field, value, pk):
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        payload = json.dumps([field, value, pk], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model, field):
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            cursor_field, value, pk = json.loads(payload)
+            # A cursor only continues the sort it was issued for
+            if cursor_field != field:
+                raise ValueError(cursor_field)
+            return model._meta.get_field(field).to_python(value), int(pk)
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound('Invalid cursor.')
+
+
+def estimate_count(queryset):
+    """Optimizer row estimate for ``queryset``, or None where the backend offers none"""
+    if connections[queryset.db].vendor != 'mysql':
+        return None
+    try:
+        plan = json.loads(queryset.order_by().values('pk').explain(format='json'))
+        block = plan['query_block']
+        table = block['table'] if 'table' in block else block['nested_loop'][-1]['table']
+        return int(float(table['rows_produced_per_join']))
+    except (DatabaseError, KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+class EstimatedCountPage(Page):
+    """Page whose successor is known from an extra fetched row rather than the total"""
+
+    def __init__(self, object_list, number, paginator, more):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return self.more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that counts exactly only up to PAGINATION_EXACT_COUNT_THRESHOLD
+    rows. Larger querysets report a count cached per filter signature for
+    PAGINATION_COUNT_CACHE_TTL seconds, or the database optimizer's row
+    estimate; ``approximate`` says which. Pages are then read by offset
+    alone, with one extra row deciding whether another page follows.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.approximate = False
+        self.exact_threshold = getattr(settings, 'PAGINATION_EXACT_COUNT_THRESHOLD', 1000)
+        self.cache_ttl = getattr(settings, 'PAGINATION_COUNT_CACHE_TTL', 300)
+
+    def count_cache_key(self):
+        sql, params = self.object_list.order_by().query.sql_with_params()
+        return 'pagination-count:' + hashlib.sha1(repr((sql, params)).encode()).hexdigest()
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        # Bounded count: never reads more than threshold + 1 rows
+        count = self.object_list.order_by()[:self.exact_threshold + 1].count()
+        if count <= self.exact_threshold:
+            return count
+
+        key = self.count_cache_key()
+        count = cache.get(key)
+        if count is None:
+            count = estimate_count(self.object_list)
+            if count is None:
+                # No estimate on this backend: count once, then serve it from cache
+                count = self.object_list.count()
+                cache.set(key, count, self.cache_ttl)
+                return count
+            cache.set(key, count, self.cache_ttl)
+        self.approximate = True
+        return max(count, self.exact_threshold + 1)
+
+    def validate_number(self, number):
+        if not self.approximate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        self.count  # settles self.approximate
+        if not self.approximate:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        more = len(rows) > self.per_page
+        if not more:
+            # Reached the end, so the total is now known
+            self.count = bottom + len(rows)
+            self.approximate = False
+        else:
+            self.count = max(self.count, bottom + len(rows))
+        return EstimatedCountPage(rows[:self.per_page], number, self, more)
+
+
+class EstimatedCountPaginationMixin:
+    """PageNumberPagination over EstimatedCountPaginator, adding ``count_is_approximate`` to responses"""
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_is_approximate'] = self.page.paginator.approximate
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count_is_approximate'] = {'type': 'boolean', 'example': False}
+        return schema
 
 
-class CustomPagination(PageNumberPagination):
+class CustomPagination(EstimatedCountPaginationMixin, PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
@@ -0,0 +1,66 @@
+import datetime
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Types orjson leaves to default(): DRF's encoder formats them
+_drf_encoder = JSONEncoder()
+
+
+def _plain_floats(data):
+    """
+    Whether every float in ``data`` is finite and written without an
+    exponent. orjson writes exponents differently (``1e20`` for ``1e+20``)
+    and NaN or infinity as ``null`` where DRF's strict mode raises.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not (value == 0 or 1e-4 <= abs(value) < 1e16):
+                return False
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return True
+
+
+def _default(obj):
+    if isinstance(obj, datetime.datetime):
+        representation = obj.isoformat()
+        if representation.endswith('+00:00'):
+            representation = representation[:-6] + 'Z'
+        return representation
+    value = _drf_encoder.default(obj)
+    if not _plain_floats(value):
+        # Surfaces as orjson.JSONEncodeError, so the render falls back
+        raise ValueError(obj)
+    return value
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer producing the same compact, unicode output with orjson.
+    Decimals, NumPy values, lazy strings and the other non-JSON types go
+    through DRF's encoder. Data orjson would write differently (exponent
+    or non-finite floats, integers wider than 64 bits) and indented output
+    (e.g. the browsable API) use the stdlib path.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if (self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context)
+                or not _plain_floats(data)):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            content = orjson.dumps(data, default=_default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by DRF too: valid JSON but not valid JavaScript
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')